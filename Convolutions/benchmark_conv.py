@@ -0,0 +1,176 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy, scipy.ndimage
+import convolutions as conv
+
+
+## Every backend takes (image, kernel, mode, cval) and returns the filtered image.
+## 'basic' only fills the valid interior and 'box' only applies to box kernels.
+BACKENDS = {
+    'basic': lambda image, kernel, mode, cval: conv.basic_convolution(image, kernel),
+    'direct': lambda image, kernel, mode, cval: conv.extended_convolution(image, kernel, mode=mode, cval=cval,
+                                                                          separable=False),
+    'separable': lambda image, kernel, mode, cval: conv.extended_convolution(image, kernel, mode=mode, cval=cval,
+                                                                             separable=True),
+    'fft': lambda image, kernel, mode, cval: conv.fft_convolution(image, kernel, mode=mode, cval=cval),
+    'auto': lambda image, kernel, mode, cval: conv.convolve(image, kernel, mode=mode, cval=cval),
+    'tiled': lambda image, kernel, mode, cval: conv.tiled_convolution(image, kernel, tile_shape=(256, 256),
+                                                                      mode=mode, cval=cval),
+    'box': lambda image, kernel, mode, cval: conv.mean_filter(image, kernel.shape, mode=mode, cval=cval),
+}
+
+
+def make_kernel(family, size, rng):
+    """Returns a normalised 'box' or 'random' kernel of the given size."""
+
+    kernel = np.ones([size, size]) if family == 'box' else rng.random([size, size])
+
+    return kernel / kernel.sum()
+
+
+def make_image(size, dtype, rng):
+    """Returns a random size x size image, spanning the full range of integer dtypes and 0..1 otherwise."""
+
+    image = rng.random([size, size])
+    if np.issubdtype(dtype, np.integer):
+        return np.round(image * np.iinfo(dtype).max).astype(dtype)
+
+    return image.astype(dtype)
+
+
+def time_backend(backend, image, kernel, mode, cval, repeats):
+    """Returns the best of 'repeats' run times, the peak traced allocation and the output."""
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = backend(image, kernel, mode, cval)
+        timings.append(time.perf_counter() - start)
+
+    ## Measure memory in a separate run, tracing slows the timed runs down
+    tracemalloc.start()
+    backend(image, kernel, mode, cval)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(timings), peak, result
+
+
+def run(sizes, kernel_sizes, families, dtypes, modes, backends, repeats=3, cval=0.0, seed=0):
+    """Runs every backend over the grid and returns a list of result records."""
+
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for size, dtype in itertools.product(sizes, dtypes):
+        image = make_image(size, dtype, rng)
+
+        for k_size, family, mode in itertools.product(kernel_sizes, families, modes):
+            ## Integer images are filtered with a float kernel, as the library does internally
+            kernel = make_kernel(family, k_size, rng)
+            if not np.issubdtype(dtype, np.integer):
+                kernel = kernel.astype(dtype)
+            reference = scipy.ndimage.convolve(image.astype(float), kernel.astype(float), mode=mode, cval=cval)
+            ## Integer outputs are rounded, so compare them against the rounded reference
+            expected = np.round(reference) if np.issubdtype(dtype, np.integer) else reference
+
+            for name in backends:
+                if name == 'box' and family != 'box':
+                    continue
+
+                seconds, peak, result = time_backend(BACKENDS[name], image, kernel, mode, cval, repeats)
+
+                ## basic_convolution leaves the border untouched, compare the interior only
+                region = (slice((k_size - 1) // 2, size - k_size // 2),) * 2 if name == 'basic' else (Ellipsis,)
+                error = np.abs(np.asarray(result, dtype=float)[region] - expected[region]).max()
+
+                record = {
+                    'backend': name,
+                    'image_size': size,
+                    'kernel_size': k_size,
+                    'kernel': family,
+                    'dtype': dtype,
+                    'mode': mode,
+                    'seconds': seconds,
+                    'mpix_per_s': size * size / seconds / 1e6,
+                    'peak_bytes': peak,
+                    'max_abs_error': float(error),
+                }
+                results.append(record)
+                print(f"{name:>9} {size:>5}px k={k_size:<3} {family:>6} {dtype:>7} {mode:>8}: "
+                      f"{record['mpix_per_s']:9.2f} MP/s  peak {peak / 2**20:8.1f} MiB  err {error:.2e}",
+                      file=sys.stderr)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the records whose throughput dropped by more than 'threshold' (a fraction)
+    relative to the matching record of a previous run."""
+
+    def key(record):
+        return tuple(record[k] for k in ('backend', 'image_size', 'kernel_size', 'kernel', 'dtype', 'mode'))
+
+    previous = {key(record): record for record in baseline['results']}
+    regressions = []
+    for record in results:
+        old = previous.get(key(record))
+        if old is not None and record['mpix_per_s'] < (1 - threshold) * old['mpix_per_s']:
+            regressions.append({**record, 'baseline_mpix_per_s': old['mpix_per_s']})
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the convolution backends against scipy.ndimage.convolve.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 1024])
+    parser.add_argument('--kernel-sizes', type=int, nargs='+', default=[3, 9, 25])
+    parser.add_argument('--kernels', nargs='+', default=['box', 'random'], choices=['box', 'random'])
+    parser.add_argument('--dtypes', nargs='+', default=['float32', 'float64'])
+    parser.add_argument('--modes', nargs='+', default=list(conv.BORDER_MODES), choices=list(conv.BORDER_MODES))
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report of a previous run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fractional throughput drop counted as a regression (default 0.2)')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.kernel_sizes, args.kernels, args.dtypes, args.modes, args.backends, args.repeats)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
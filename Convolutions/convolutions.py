@@ -1,161 +1,780 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 
-def basic_convolution(image, kernel, verbose=False):
+# Border modes named as in scipy.ndimage, mapped onto the equivalent np.pad modes
+# E.g 'reflect' repeats the edge pixel (d c b a | a b c d) while 'mirror' does not (d c b | a b c d)
+BORDER_MODES = {
+    'nearest': 'edge',
+    'reflect': 'symmetric',
+    'mirror': 'reflect',
+    'wrap': 'wrap',
+    'constant': 'constant',
+}
+
+
+def _pad(image, kernel_shape, mode='nearest', cval=0.0):
+    """Pads the first two (spatial) axes of 'image' once by the kernel radius using the given
+    border 'mode', so that every output pixel can be computed without any branching.
+    Even-sized kernels get the extra row or column after the image, which centres them where
+    scipy.ndimage.convolve does."""
+
+    if mode not in BORDER_MODES:
+        raise ValueError(f"Unknown border mode '{mode}', expected one of {sorted(BORDER_MODES)}")
+
+    k_h, k_w = kernel_shape
+    travel_h = (k_h - 1) // 2
+    travel_w = (k_w - 1) // 2
+    pad_width = ((travel_h, k_h - 1 - travel_h), (travel_w, k_w - 1 - travel_w)) + ((0, 0),) * (image.ndim - 2)
+
+    if mode == 'constant':
+        return np.pad(image, pad_width, mode='constant', constant_values=cval)
+
+    return np.pad(image, pad_width, mode=BORDER_MODES[mode])
+
+
+def _is_integer(array):
+    return np.issubdtype(array.dtype, np.integer)
+
+
+def _working_arrays(image, kernel, dtype=None):
+    """Returns the image and kernel as arrays, both cast to 'dtype' when one is given.
+    Integer images (uint8, uint16) stay integer and get a float32 kernel, so the sums are
+    accumulated in float32 and only rounded back to the image dtype on output."""
+
+    image = np.asarray(image)
+    kernel = np.asarray(kernel)
+    if dtype is not None:
+        image = image.astype(dtype, copy=False)
+    if _is_integer(image):
+        kernel = kernel.astype(np.float32, copy=False)
+    elif dtype is not None:
+        kernel = kernel.astype(dtype, copy=False)
+
+    return image, kernel
+
+
+def _store(result, out):
+    """Writes 'result' into 'out' (if given and not already the same buffer) and returns it.
+    Float results stored into an integer 'out' are rounded and clipped to its range."""
+
+    if out is None or result is out:
+        return result
+
+    if _is_integer(out) and not _is_integer(result):
+        info = np.iinfo(out.dtype)
+        result = np.clip(np.rint(result, out=result), info.min, info.max, out=result)
+    out[...] = result
+
+    return out
+
+
+def _correlate(padded, kernel, out_shape, out=None, dtype=None):
+    """Correlates 'padded' with 'kernel' over the valid region of size 'out_shape'
+    by accumulating one shifted slice of the image per kernel tap. Any trailing axes of
+    'padded' (colour channels, stacked images) are carried through.
+
+    Accumulation happens in 'dtype' (by default the promoted image and kernel dtype),
+    directly inside 'out' when it has that dtype, reusing one scratch buffer for the taps."""
+
+    out_h, out_w = out_shape
+    shape = tuple(out_shape) + padded.shape[2:]
+    if dtype is None:
+        dtype = np.result_type(padded, kernel)
+
+    accumulator = out if out is not None and out.dtype == dtype else np.empty(shape, dtype=dtype)
+    tap = np.empty(shape, dtype=dtype) if kernel.size > 1 else None
+
+    for x in range(kernel.shape[0]):
+        for y in range(kernel.shape[1]):
+            if x == 0 and y == 0:
+                np.multiply(padded[:out_h, :out_w], kernel[0, 0], out=accumulator)
+            else:
+                np.multiply(padded[x:x + out_h, y:y + out_w], kernel[x, y], out=tap)
+                accumulator += tap
+
+    return _store(accumulator, out)
+
+
+def _parallel_rows(fill, n_rows, workers=1):
+    """Splits rows 0..n_rows into one band per worker and calls fill(rows) for each band on a
+    thread pool (NumPy releases the GIL in the array arithmetic). Each call writes its own band
+    of a shared output, so nothing needs stitching or copying afterwards."""
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, n_rows))
+
+    if workers == 1:
+        fill(slice(0, n_rows))
+        return
+
+    bounds = np.linspace(0, n_rows, workers + 1).astype(int)
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(fill, [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]))
+
+
+def basic_convolution(image, kernel, verbose=False, dtype=None, out=None, accumulate=None):
+    """Convolves the pixels of 'image' whose whole neighbourhood lies inside the image,
+    leaving the border pixels set to one. 'dtype' is the working and output dtype (default the
+    image's), 'out' an optional preallocated output and 'accumulate' the accumulation dtype."""
     
+    image, kernel = _working_arrays(image, kernel, dtype)
     kernel = np.flipud(np.fliplr(kernel))
     # Get the kernel dimensions and a unit for finding relative position
     # E.g the top right of a 5x5 kernel will equate to (2,2) so the travel size is 2
-    k_h = len(kernel)
-    k_w = len(kernel[0])
-    i_h = len(image)
-    i_w = len(image[0])
+    k_h, k_w = kernel.shape
+    i_h, i_w = image.shape[:2]
     
-    travel_h = k_h // 2
-    travel_w = k_w // 2
+    # Even kernels reach one pixel further after the centre than before it, as in scipy
+    travel_h = (k_h - 1) // 2
+    travel_w = (k_w - 1) // 2
+    after_h = k_h - 1 - travel_h
+    after_w = k_w - 1 - travel_w
     
-    image_out = np.ones_like(image)
+    if out is None:
+        image_out = np.ones_like(image)
+    else:
+        image_out = out
+        image_out[:travel_h] = image_out[i_h - after_h:] = 1
+        image_out[:, :travel_w] = image_out[:, i_w - after_w:] = 1
 
-    for i in range(travel_h, i_h - travel_h):
-        for j in range(travel_w, i_w - travel_w):
-            
-            accumulator = 0
-            
-            for x in range(k_h):
-                for y in range(k_w):
-                    
-                    try:
-                        accumulator += image[i - travel_h + x][j - travel_w + y] * kernel[x][y]
-                    except:
-                        continue
-            
-            image_out[i][j] = accumulator
+    # Only pixels whose whole neighbourhood lies inside the image are filtered
+    valid = (i_h - k_h + 1, i_w - k_w + 1)
+    if valid[0] > 0 and valid[1] > 0:
+        _correlate(image, kernel, valid, out=image_out[travel_h:i_h - after_h, travel_w:i_w - after_w],
+                   dtype=accumulate)
 
     return image_out
 
 
-def extended_convolution(image, kernel, verbose=False):
+def separate_kernel(kernel, tol=1e-6):
+    """Splits 'kernel' into a sum of outer products of column and row vectors using an SVD,
+    dropping components whose singular value is below 'tol' times the largest one.
+    Returns (columns, rows) with shapes (rank, k_h) and (rank, k_w), in the kernel's float dtype."""
+
+    kernel = np.asarray(kernel)
+    u, s, vt = np.linalg.svd(kernel.astype(float))
+    rank = max(1, int(np.sum(s > tol * s[0])))
+    root = np.sqrt(s[:rank])[:, None]
+    dtype = np.result_type(kernel, np.float32)
+
+    return (u[:, :rank].T * root).astype(dtype), (vt[:rank] * root).astype(dtype)
+
+
+def _correlate_separable(padded, columns, rows, out_shape, out=None, dtype=None):
+    """Correlates 'padded' with the kernel sum(outer(columns[r], rows[r])) as a row pass
+    followed by a column pass for each component, accumulating in 'dtype' as _correlate does."""
+
+    out_h, out_w = out_shape
+    if dtype is None:
+        dtype = np.result_type(padded, columns, rows)
+
+    accumulator = out if out is not None and out.dtype == dtype else None
+
+    for r, (column, row) in enumerate(zip(columns, rows)):
+        horizontal = _correlate(padded, row[None, :], (padded.shape[0], out_w), dtype=dtype)
+        if accumulator is None:
+            accumulator = _correlate(horizontal, column[:, None], out_shape, dtype=dtype)
+        elif r == 0:
+            _correlate(horizontal, column[:, None], out_shape, out=accumulator, dtype=dtype)
+        else:
+            accumulator += _correlate(horizontal, column[:, None], out_shape, dtype=dtype)
+
+    return _store(accumulator, out)
+
+
+def extended_convolution(image, kernel, verbose=False, mode='nearest', cval=0.0, separable=None, tol=1e-6,
+                         workers=1, dtype=None, out=None, accumulate=None):
+    """Convolves the whole 'image' with 'kernel', extending the image past its borders
+    according to 'mode' ('nearest', 'reflect', 'mirror', 'wrap' or 'constant' with 'cval'),
+    with the same meaning as in scipy.ndimage.convolve.
+
+    Low-rank kernels (box, Gaussian, Sobel, ...) are run as 1-D row and column passes when
+    that is cheaper. 'separable' forces (True) or disables (False) this path, and 'tol' is the
+    relative singular value below which a kernel component is treated as zero.
+
+    'workers' splits the rows into bands computed on that many threads (None for one per
+    CPU core); the result is bit-for-bit identical to the single-threaded one.
+
+    'dtype' sets the working and output dtype (default the image's, e.g. float32 to halve the
+    memory traffic), 'out' is an optional preallocated output written in place, and
+    'accumulate' the dtype sums are accumulated in (default the working dtype)."""
     
+    image, kernel = _working_arrays(image, kernel, dtype)
     kernel = np.flipud(np.fliplr(kernel))
-    # E.g the top right of a 5x5 kernel will equate to (2,2) so the travel size is 2
-    image_height = len(image)
-    image_width = len(image[0])
-    kernel_size = len(kernel)
-    travel = kernel_size // 2
-    image_out = np.ones_like(image)
-
-    for i in range(len(image)):
-        for j in range(len(image[i])):
-            accumulator = 0
-            
-            
-            for x in range(-travel, travel + 1):
-                for y in range(-travel,travel + 1):
-                    
-                    try:
-                        
-                        # Bottom right corner
-                        if (i+x) >= image_height and (j+y) >= image_width:
-                            accumulator += image[image_height-1][image_width-1] * kernel[x + travel][y + travel]
-
-                        # Bottom left and top right corner
-                        elif (((i+x) >= image_height and (j+y) < 0) or 
-                              ((i+x) == image_height-1 and (j+y) < 0) or
-                              ((i+x) >= image_height and (j+y) == 0)):
-                            accumulator += image[image_height-1][0] * kernel[x + travel][y + travel]
-                        elif (((i+x) < 0 and (j+y) >= image_width) or
-                              ((i+x) < 0 and (j+y) == image_width-1) or 
-                              ((i+x) == 0 and (j+y) >= image_width)):
-                            accumulator += image[0][image_width-1] * kernel[x + travel][y + travel]
-
-                        # Rigth / bottom edges
-                        elif (i+x) >= image_height and (j+y) < image_width:
-                            accumulator += image[image_height-1][j+y] * kernel[x + travel][y + travel]
-                        elif (i+x) < image_height and (j+y) >= image_width:
-                            accumulator += image[i+x][image_width-1] * kernel[x + travel][y + travel]
-
-                        # Top left corner and top / left edges
-                        elif (i+x) < 0 and (j+y) < 0:
-                            accumulator += image[0][0] * kernel[x + travel][y + travel]
-                        elif (i+x) < 0 and (j+y) >= 0:
-                            accumulator += image[0][j+y] * kernel[x + travel][y + travel]
-                        elif (i+x) >= 0 and (j+y) < 0:
-                            accumulator += image[i+x][0] * kernel[x + travel][y + travel]
-                            
-                        # Everything else
-                        else:
-                            accumulator += image[i+x][j+y] * kernel[x + travel][y + travel]
-                            
-                    except:
-                        continue
-                        
-            image_out[i][j] = accumulator
+    k_h, k_w = kernel.shape
+    image_out = np.empty_like(image) if out is None else out
+
+    padded = _pad(image, kernel.shape, mode, cval)
+
+    if separable is not False:
+        columns, rows = separate_kernel(kernel, tol)
+        if separable is None:
+            separable = len(columns) * (k_h + k_w) < k_h * k_w
+
+    def fill(band):
+        # The padded rows needed by this band, as a view of the shared padded image
+        band_padded = padded[band.start:band.stop + k_h - 1]
+        band_shape = (band.stop - band.start, image.shape[1])
+        if separable:
+            _correlate_separable(band_padded, columns, rows, band_shape, out=image_out[band], dtype=accumulate)
+        else:
+            _correlate(band_padded, kernel, band_shape, out=image_out[band], dtype=accumulate)
+
+    _parallel_rows(fill, image.shape[0], workers)
             
     return image_out
 
 
-def fft_convolution(image,kernel):
+@functools.lru_cache(maxsize=1024)
+def _next_fast_len(n):
+    """Returns the smallest length >= 'n' whose only prime factors are 2, 3 and 5,
+    which the FFT can transform efficiently."""
 
-    travel = len(kernel) // 2
+    best = 2 * n
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            # Smallest power of two taking p35 up to at least n
+            p235 = p35
+            while p235 < n:
+                p235 *= 2
+            best = min(best, p235)
+            p35 *= 3
+        p5 *= 5
 
-    image_height = len(image)
-    image_width = len(image[0])
-    
-    size = (image_height - len(kernel), image_width - len(kernel[0]))  # total amount of padding
-    f_kernel = np.pad(kernel, (((size[0]+1)//2, size[0]//2), ((size[1]+1)//2, size[1]//2)))
-    f_kernel = np.fft.ifftshift(f_kernel)
+    return best
+
+
+def fft_convolution(image, kernel, mode='nearest', cval=0.0, dtype=None, out=None):
+    """Convolves 'image' with 'kernel' in the frequency domain. The image is padded once
+    for the border 'mode', transformed with a real FFT of a fast size, multiplied by the
+    kernel spectrum and cropped back to the image size. With dtype=np.float32 the transforms
+    run in single precision, as they do for integer images; 'out' is an optional preallocated
+    output. Integer images are returned in their own dtype."""
+
+    image, kernel = _working_arrays(image, kernel, dtype)
+    padded = _pad(image, kernel.shape, mode, cval)
+    if out is None and _is_integer(image):
+        out = np.empty_like(image)
+
+    return _store(_fft_correlate(padded, kernel, image.shape), out)
+
+
+def _fft_correlate(padded, kernel, out_shape):
+    """Convolves a padded image with 'kernel' through the FFT and crops the valid region."""
+
+    fft_size = _fft_size(padded.shape)
+    product = np.fft.irfft2(_image_spectrum(padded, fft_size) * _kernel_spectrum(kernel, fft_size, padded.ndim),
+                            fft_size, axes=(0, 1))
+
+    return _crop_valid(product, kernel.shape, out_shape)
+
+
+def _fft_size(padded_shape):
+    """Returns a fast FFT size for the spatial axes of a padded image. Its linear size is
+    enough that the circular wrap-around never reaches the cropped region."""
+
+    return (_next_fast_len(padded_shape[0]), _next_fast_len(padded_shape[1]))
+
+
+def _image_spectrum(padded, fft_size):
+    """Real FFT of the spatial axes of a padded image, in single precision for integer images."""
+
+    if _is_integer(padded):
+        padded = padded.astype(np.float32)
+
+    return np.fft.rfft2(padded, fft_size, axes=(0, 1))
+
+
+class SpectrumCache:
+    """Bounded LRU cache of kernel spectra, keyed by the kernel contents, the FFT size and
+    the dtype, so repeated convolutions with the same kernel at the same frame size skip the
+    kernel transform. The least recently used spectra are evicted once 'max_bytes' is exceeded."""
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kernel, fft_size):
+        kernel = np.ascontiguousarray(kernel)
+        digest = hashlib.sha1(kernel.tobytes()).hexdigest()
+        return digest, kernel.shape, kernel.dtype.str, tuple(fft_size)
+
+    def get(self, kernel, fft_size):
+        """Returns the (read-only) real FFT of 'kernel' at 'fft_size', computing it on a miss."""
+
+        key = self.key(kernel, fft_size)
+        with self._lock:
+            spectrum = self._entries.get(key)
+            if spectrum is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return spectrum
+            self.misses += 1
+
+        spectrum = np.fft.rfft2(kernel, fft_size)
+        spectrum.flags.writeable = False
+
+        with self._lock:
+            if key not in self._entries and spectrum.nbytes <= self.max_bytes:
+                self._entries[key] = spectrum
+                self.nbytes += spectrum.nbytes
+                self._evict()
+
+        return spectrum
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, spectrum = self._entries.popitem(last=False)
+            self.nbytes -= spectrum.nbytes
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        """Changes the memory cap, evicting spectra until the cache fits."""
+
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Drops every cached spectrum and resets the counters."""
+
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters and current size of the cache."""
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Shared by fft_convolution and convolve_batch
+spectrum_cache = SpectrumCache()
+
+
+def _kernel_spectrum(kernel, fft_size, ndim=2):
+    """Real FFT of 'kernel' at 'fft_size' (from spectrum_cache), with unit trailing axes added
+    so that it broadcasts against the spectrum of an image with 'ndim' axes."""
+
+    spectrum = spectrum_cache.get(kernel, fft_size)
+
+    return spectrum.reshape(spectrum.shape + (1,) * (ndim - 2))
+
+
+def _crop_valid(product, kernel_shape, image_shape):
+    """Crops the image-sized region out of the linear convolution of a padded image."""
+
+    k_h, k_w = kernel_shape
+    i_h, i_w = image_shape[:2]
+
+    return product[k_h - 1:k_h - 1 + i_h, k_w - 1:k_w - 1 + i_w]
 
-    product = np.real(np.fft.ifft2(np.fft.fft2(image) * np.fft.fft2(f_kernel)))
+
+# Seconds per unit of work for each backend (see _work_units), used until calibrate() is run
+DEFAULT_COST_MODEL = {
+    'direct': 2.0e-9,
+    'separable': 4.0e-9,
+    'fft': 3.5e-9,
+}
+
+CALIBRATION_FILE = os.path.join(os.path.expanduser('~'), '.convolutions_calibration.json')
+
+_cost_model = None
+
+
+def _work_units(image_shape, kernel_shape, rank):
+    """Returns the amount of work each backend does for the given problem size:
+    multiply-adds for the direct and separable paths and N log2 N for the FFT path."""
+
+    i_h, i_w = image_shape[:2]
+    k_h, k_w = kernel_shape
+    p_h, p_w = i_h + k_h - 1, i_w + k_w - 1
+    fft_n = _next_fast_len(p_h) * _next_fast_len(p_w)
+
+    return {
+        'direct': i_h * i_w * k_h * k_w,
+        'separable': rank * (p_h * i_w * k_w + i_h * i_w * k_h),
+        'fft': fft_n * np.log2(max(fft_n, 2)),
+    }
+
+
+def get_cost_model():
+    """Returns the per-unit backend costs, loading the host calibration on first use if one
+    has been saved to CALIBRATION_FILE, otherwise the built-in defaults."""
+
+    global _cost_model
+    if _cost_model is None:
+        _cost_model = dict(DEFAULT_COST_MODEL)
+        try:
+            with open(CALIBRATION_FILE) as f:
+                _cost_model.update(json.load(f)['cost_model'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    return _cost_model
+
+
+def estimate_costs(image_shape, kernel_shape, rank, workers=1):
+    """Estimates the run time in seconds of each backend for a kernel of the given rank.
+    The direct and separable backends are split across 'workers' threads, the FFT is not."""
+
+    model = get_cost_model()
+    units = _work_units(image_shape, kernel_shape, rank)
+    costs = {method: units[method] * model[method] for method in units}
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    costs['direct'] /= max(workers, 1)
+    costs['separable'] /= max(workers, 1)
+
+    return costs
+
+
+def calibrate(path=CALIBRATION_FILE, size=512, repeats=3):
+    """Times each backend on this host, stores the measured per-unit costs as the active
+    cost model and saves them to 'path' (None to skip saving). Returns the cost model."""
+
+    global _cost_model
+    rng = np.random.default_rng(0)
+    image = rng.random((size, size))
+    kernels = {
+        'direct': rng.random((7, 7)),
+        'separable': np.ones((15, 15)),
+        'fft': rng.random((31, 31)),
+    }
+    backends = {
+        'direct': lambda k: extended_convolution(image, k, separable=False),
+        'separable': lambda k: extended_convolution(image, k, separable=True),
+        'fft': lambda k: fft_convolution(image, k),
+    }
+
+    model = {}
+    for method, kernel in kernels.items():
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            backends[method](kernel)
+            timings.append(time.perf_counter() - start)
+        rank = len(separate_kernel(kernel)[0])
+        model[method] = float(min(timings)) / _work_units(image.shape, kernel.shape, rank)[method]
+
+    _cost_model = model
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump({'cost_model': model, 'image_size': size}, f, indent=2)
+
+    return model
+
+
+def _select_method(image_shape, kernels, tol=1e-6, workers=1, methods=('direct', 'separable', 'fft')):
+    """Returns the backend among 'methods' the cost model predicts to be cheapest for a bank
+    of same-sized kernels."""
+
+    rank = max(len(separate_kernel(kernel, tol)[0]) for kernel in kernels)
+    costs = estimate_costs(image_shape, kernels.shape[1:], rank, workers)
+
+    return min(methods, key=costs.get)
+
+
+def _check_method(method):
+    if method not in ('direct', 'separable', 'fft'):
+        raise ValueError(f"Unknown convolution method '{method}', expected 'auto', 'direct', 'separable' or 'fft'")
+
+
+def _convolve_padded(padded, kernel, out_shape, method, tol=1e-6, out=None, accumulate=None):
+    """Convolves an already padded image with 'kernel' using the given backend,
+    writing the valid region of size 'out_shape' into 'out' (or a new array)."""
+
+    if method == 'fft':
+        return _store(_fft_correlate(padded, kernel, out_shape), out)
 
     kernel = np.flipud(np.fliplr(kernel))
+    if method == 'separable':
+        columns, rows = separate_kernel(kernel, tol)
+        return _correlate_separable(padded, columns, rows, out_shape, out=out, dtype=accumulate)
+
+    return _correlate(padded, kernel, out_shape, out=out, dtype=accumulate)
+
+
+def convolve(image, kernel, mode='nearest', cval=0.0, method='auto', tol=1e-6, workers=1,
+             dtype=None, out=None, accumulate=None):
+    """Convolves 'image' with 'kernel' using the border 'mode' and 'cval' of scipy.ndimage.convolve.
+    'method' is 'direct', 'separable' or 'fft', or 'auto' to pick whichever the cost model
+    predicts to be fastest for this image size, kernel size and kernel rank. The direct and
+    separable backends run on 'workers' threads; the FFT backend always runs on one.
+    'dtype', 'out' and 'accumulate' are as in extended_convolution."""
+
+    image = np.asarray(image)
+    kernel = np.asarray(kernel)
+
+    if method == 'auto':
+        method = _select_method(image.shape, kernel[None], tol, workers)
+
+    if method == 'direct':
+        return extended_convolution(image, kernel, mode=mode, cval=cval, separable=False, workers=workers,
+                                    dtype=dtype, out=out, accumulate=accumulate)
+    if method == 'separable':
+        return extended_convolution(image, kernel, mode=mode, cval=cval, separable=True, tol=tol, workers=workers,
+                                    dtype=dtype, out=out, accumulate=accumulate)
+    if method == 'fft':
+        return fft_convolution(image, kernel, mode=mode, cval=cval, dtype=dtype, out=out)
+
+    raise ValueError(f"Unknown convolution method '{method}', expected 'auto', 'direct', 'separable' or 'fft'")
+
+
+def convolve_batch(images, kernels, mode='nearest', cval=0.0, method='auto', tol=1e-6,
+                   dtype=None, out=None, accumulate=None):
+    """Convolves a stack of images (N, H, W) or (N, H, W, C) with a bank of kernels (K, kh, kw),
+    returning (N, K, H, W) or (N, K, H, W, C). The whole stack is padded once, and in the FFT
+    path each image is transformed once and reused for every kernel of the bank.
+    'dtype', 'out' and 'accumulate' are as in extended_convolution."""
+
+    images, kernels = _working_arrays(images, kernels, dtype)
+    if kernels.ndim == 2:
+        kernels = kernels[None]
+
+    n_images = images.shape[0]
+    i_h, i_w = images.shape[1:3]
+    k_h, k_w = kernels.shape[1:]
+
+    # Move the stack behind the spatial axes, (H, W, N[, C]), so every backend sees one image
+    stacked = np.moveaxis(images, 0, 2)
+    padded = _pad(stacked, (k_h, k_w), mode, cval)
+
+    if method == 'auto':
+        method = _select_method((i_h, i_w), kernels, tol)
+    _check_method(method)
+
+    # The output keeps the (working) image dtype, as in extended_convolution
+    if out is None:
+        out = np.empty((n_images, len(kernels)) + images.shape[1:], dtype=images.dtype)
+
+    if method == 'fft':
+        fft_size = _fft_size(padded.shape)
+        image_spectrum = _image_spectrum(padded, fft_size)
+
+    for k, kernel in enumerate(kernels):
+        # View of this kernel's outputs in the (H, W, N[, C]) layout the backends produce
+        target = np.moveaxis(out[:, k], 0, 2)
+        if method == 'fft':
+            product = np.fft.irfft2(image_spectrum * _kernel_spectrum(kernel, fft_size, padded.ndim),
+                                    fft_size, axes=(0, 1))
+            _store(_crop_valid(product, kernel.shape, stacked.shape), target)
+        else:
+            _convolve_padded(padded, kernel, (i_h, i_w), method, tol, out=target, accumulate=accumulate)
+
+    return out
+
+
+def _border_index(indices, size, mode):
+    """Maps (possibly out of range) 'indices' along an axis of length 'size' back into the
+    image following the border 'mode', matching the padding done by _pad. For 'constant'
+    the indices are clamped and the caller fills the out of range positions with cval."""
+
+    if mode in ('nearest', 'constant'):
+        return np.clip(indices, 0, size - 1)
+    if mode == 'wrap':
+        return np.mod(indices, size)
+    if mode == 'reflect':
+        # Period 2n, repeating the edge pixel: d c b a | a b c d | d c b a
+        folded = np.mod(indices, 2 * size)
+        return np.where(folded < size, folded, 2 * size - 1 - folded)
+    if mode == 'mirror':
+        # Period 2n - 2, without repeating the edge pixel: d c b | a b c d | c b a
+        if size == 1:
+            return np.zeros_like(indices)
+        folded = np.mod(indices, 2 * size - 2)
+        return np.where(folded < size, folded, 2 * size - 2 - folded)
+
+    raise ValueError(f"Unknown border mode '{mode}', expected one of {sorted(BORDER_MODES)}")
+
+
+def _read_padded_tile(image, rows, cols, kernel_shape, mode='nearest', cval=0.0):
+    """Reads the tile image[rows, cols] (two slices) together with the halo the kernel needs,
+    applying the border 'mode' of the whole image. Only the tile and its halo are loaded,
+    so 'image' can be an np.memmap or any array-like supporting NumPy indexing."""
+
+    k_h, k_w = kernel_shape
+    i_h, i_w = image.shape[:2]
+    row_idx = np.arange(rows.start - (k_h - 1) // 2, rows.stop + k_h // 2)
+    col_idx = np.arange(cols.start - (k_w - 1) // 2, cols.stop + k_w // 2)
+
+    inside_rows = row_idx[0] >= 0 and row_idx[-1] < i_h
+    inside_cols = col_idx[0] >= 0 and col_idx[-1] < i_w
+
+    # Interior tiles are a plain slice, only tiles on the image border need a gather
+    if inside_rows and inside_cols:
+        return np.asarray(image[row_idx[0]:row_idx[-1] + 1, col_idx[0]:col_idx[-1] + 1])
+
+    tile = np.asarray(image[np.ix_(_border_index(row_idx, i_h, mode), _border_index(col_idx, i_w, mode))])
+
+    if mode == 'constant':
+        tile[(row_idx < 0) | (row_idx >= i_h)] = cval
+        tile[:, (col_idx < 0) | (col_idx >= i_w)] = cval
+
+    return tile
+
+
+def _tiles(shape, tile_shape):
+    """Yields (rows, cols) slice pairs covering an image of the given shape."""
+
+    for r in range(0, shape[0], tile_shape[0]):
+        for c in range(0, shape[1], tile_shape[1]):
+            yield slice(r, min(r + tile_shape[0], shape[0])), slice(c, min(c + tile_shape[1], shape[1]))
+
+
+def tiled_convolution(image, kernel, out=None, tile_shape=(1024, 1024), mode='nearest', cval=0.0,
+                      method='auto', tol=1e-6, workers=1, dtype=None, accumulate=None):
+    """Convolves an image too large for memory, such as an np.memmap, one tile at a time.
+    Each tile is read with the halo the kernel needs, so peak memory scales with 'tile_shape'
+    rather than the image size, and the result is written into 'out': an array-like of the
+    image shape, a path for a new .npy memory-mapped output, or None for an in-memory array.
+    The direct and separable backends give results identical to the in-memory path, so 'auto'
+    picks whichever of the two convolve would prefer for the whole image.
+
+    With 'workers' > 1 (None for one per CPU core) tiles are processed on a thread pool,
+    holding up to one tile per worker in memory at a time. Tiles are cast to 'dtype' as they
+    are read, and 'accumulate' is as in extended_convolution. As there, the output keeps the
+    image's dtype by default, and integer images are summed in float32."""
+
+    kernel = np.asarray(kernel)
+    if np.issubdtype(image.dtype if dtype is None else dtype, np.integer):
+        kernel = kernel.astype(np.float32, copy=False)
+    elif dtype is not None:
+        kernel = kernel.astype(dtype, copy=False)
+    if dtype is None:
+        dtype = image.dtype
+
+    if out is None:
+        out = np.empty(image.shape, dtype=dtype)
+    elif isinstance(out, (str, os.PathLike)):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=image.shape)
+
+    if method == 'auto':
+        method = _select_method(image.shape, kernel[None], tol, workers, methods=('direct', 'separable'))
+    _check_method(method)
+
+    def fill(tile):
+        rows, cols = tile
+        padded = _read_padded_tile(image, rows, cols, kernel.shape, mode, cval).astype(dtype, copy=False)
+        _convolve_padded(padded, kernel, (rows.stop - rows.start, cols.stop - cols.start), method, tol,
+                         out=out[rows, cols], accumulate=accumulate)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for tile in _tiles(image.shape, tile_shape):
+            fill(tile)
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(fill, _tiles(image.shape, tile_shape)))
+
+    if isinstance(out, np.memmap):
+        out.flush()
+
+    return out
+
+
+def _window_size(size):
+    return (size, size) if np.isscalar(size) else tuple(size)
+
+
+def box_filter(image, size, mode='nearest', cval=0.0, normalize=False, dtype=None, out=None, accumulate=None):
+    """Sums (or averages, with 'normalize') 'image' over a 'size' (int or (h, w)) box around
+    every pixel, using a summed-area table so the cost per pixel does not depend on the box
+    size. Borders follow 'mode' as in extended_convolution, and the window is placed exactly
+    as a convolution with np.ones(size) would place it. Trailing axes are filtered independently.
+
+    The result has 'dtype' (default float64, integer types are rounded and clipped to their
+    range) and is written into 'out' if given. The table is
+    accumulated in 'accumulate', float64 by default since float32 tables lose precision quickly."""
+
+    image = np.asarray(image)
+    window = _window_size(size)
+    total = _box_sum(_pad(image, window, mode, cval), window, image.shape, accumulate)
+
+    if normalize and _is_integer(total):
+        total = total / (window[0] * window[1])
+    elif normalize:
+        total /= window[0] * window[1]
+
+    if out is None:
+        if dtype is None:
+            return total
+        out = np.empty(total.shape, dtype=dtype)
+
+    return _store(total, out)
+
+
+def _box_sum(padded, window, image_shape, dtype=None):
+    """Sums a padded image over every 'window' sized box with a summed-area table."""
+
+    k_h, k_w = window
+    i_h, i_w = image_shape[:2]
+
+    # Integral image with a leading row and column of zeros, so table[i, j] = padded[:i, :j].sum()
+    table = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1) + padded.shape[2:],
+                     dtype=dtype if dtype is not None else np.result_type(padded, float))
+    np.cumsum(padded, axis=0, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+
+    total = table[k_h:k_h + i_h, k_w:k_w + i_w] - table[:i_h, k_w:k_w + i_w] \
+        - table[k_h:k_h + i_h, :i_w] + table[:i_h, :i_w]
+
+    return total
+
+
+def mean_filter(image, size, mode='nearest', cval=0.0):
+    """Local mean of 'image' over a 'size' box, at a cost independent of the box size.
+    Integer images are returned in their own dtype."""
+
+    if _is_integer(image):
+        # Integer sums are exact in an int64 table
+        return _store(box_filter(image, size, mode, cval, normalize=True, accumulate=np.int64),
+                      np.empty_like(image))
+
+    return box_filter(image, size, mode, cval, normalize=True)
+
+
+def local_statistics(image, size, mode='nearest', cval=0.0):
+    """Returns the local (mean, variance) of 'image' over a 'size' box. The image is padded
+    once, then it and its square are stacked and filtered through one summed-area table pass."""
+
+    image = np.asarray(image, dtype=float)
+    window = _window_size(size)
+    padded = _pad(image, window, mode, cval)
+    stacked = np.stack([padded, padded * padded], axis=-1)
+    moments = _box_sum(stacked, window, image.shape) / (window[0] * window[1])
+
+    mean = moments[..., 0]
+    variance = np.maximum(moments[..., 1] - mean * mean, 0)
 
-    for i in range(image_height):
-        for j in range(image_width):
-            if ((i < travel + 1 or i > image_height - (travel + 1)) or
-                (j < travel + 1 or j > image_width - (travel + 1))):
-
-                accumulator = 0
-
-                for x in range(-travel, travel + 1):
-                    for y in range(-travel,travel + 1):
-                    
-                        try:
-                        
-                        # Bottom right corner
-                            if (i+x) >= image_height and (j+y) >= image_width:
-                                accumulator += image[image_height-1][image_width-1] * kernel[x + travel][y + travel]
-
-                        # Bottom left and top right corner
-                            elif (((i+x) >= image_height and (j+y) < 0) or 
-                                  ((i+x) == image_height-1 and (j+y) < 0) or
-                                ((i+x) >= image_height and (j+y) == 0)):
-                                accumulator += image[image_height-1][0] * kernel[x + travel][y + travel]
-                            elif (((i+x) < 0 and (j+y) >= image_width) or
-                                  ((i+x) < 0 and (j+y) == image_width-1) or 
-                                ((i+x) == 0 and (j+y) >= image_width)):
-                                accumulator += image[0][image_width-1] * kernel[x + travel][y + travel]
-
-                        # Ritgh / bottom edges
-                            elif (i+x) >= image_height and (j+y) < image_width:
-                                accumulator += image[image_height-1][j+y] * kernel[x + travel][y + travel]
-                            elif (i+x) < image_height and (j+y) >= image_width:
-                                accumulator += image[i+x][image_width-1] * kernel[x + travel][y + travel]
-
-                        # Top left corner and top / left edges
-                            elif (i+x) < 0 and (j+y) < 0:
-                                accumulator += image[0][0] * kernel[x + travel][y + travel]
-                            elif (i+x) < 0 and (j+y) >= 0:
-                                accumulator += image[0][j+y] * kernel[x + travel][y + travel]
-                            elif (i+x) >= 0 and (j+y) < 0:
-                                accumulator += image[i+x][0] * kernel[x + travel][y + travel]
-                            
-                        # Everything else
-                            else:
-                                accumulator += image[i+x][j+y] * kernel[x + travel][y + travel]
-                            
-                        except:
-                            continue
-                        
-                product[i][j] = accumulator
-
-    return product
+    return mean, variance
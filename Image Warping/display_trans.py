@@ -9,7 +9,7 @@ directory = os.path.dirname(os.path.abspath(__file__))
 
 print(directory)
 
-source = plt.imread(directory + '\mona.jpg') / 255.
+source = plt.imread(directory + '\mona.jpg')
 
 ## Basic transformations to manipulate the source image.
 T = np.array([[1, 0, -source.shape[1] / 2],
@@ -50,7 +50,7 @@ plt.show()
 
 ### LENS UNDISTORTION ###
 
-source = plt.imread(directory + '\window.jpg') / 255.
+source = plt.imread(directory + '\window.jpg')
 camera_matrix = np.array([[474.53, 0, 405.96], [0, 474.53, 217.81], [0, 0, 1]])
 dist_coeffs = np.array([-0.27194, 0.11517, -0.029859])
 
@@ -0,0 +1,111 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import transforms as trans
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+def ordered_map(function, items, workers=4, depth=8):
+    """Applies 'function' to every item on a pool of 'workers' threads and yields the results
+    in input order. At most 'depth' items are in flight at once, so memory stays bounded however
+    long the stream is. NumPy and image decoders release the GIL, so the threads run in parallel."""
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(function, item))
+                if len(pending) >= depth:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # The consumer stopped early: drop the work that has not started yet
+            for future in pending:
+                future.cancel()
+
+
+def list_images(directory):
+    """Returns the image files of 'directory' in sorted order."""
+
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_image(path):
+    """Decodes one image file into an array, as the display scripts do with plt.imread."""
+
+    import matplotlib.pyplot as plt
+
+    return plt.imread(path)
+
+
+def read_raw_video(path, frame_shape, dtype=np.uint8):
+    """Yields the frames of a headerless raw video file of back-to-back frames of 'frame_shape'
+    and 'dtype', reading one frame at a time through a memory map."""
+
+    frames = np.memmap(path, dtype=dtype, mode='r')
+    frame_size = int(np.prod(frame_shape))
+
+    for start in range(0, len(frames) - frame_size + 1, frame_size):
+        yield np.array(frames[start:start + frame_size]).reshape(frame_shape)
+
+
+def write_raw_video(frames, path):
+    """Appends every frame to a raw video file as it arrives, returning the number written."""
+
+    count = 0
+    with open(path, 'wb') as f:
+        for frame in frames:
+            np.ascontiguousarray(frame).tofile(f)
+            count += 1
+
+    return count
+
+
+def decode_frames(source, workers=2, depth=8):
+    """Yields decoded frames from 'source': a directory of images, an iterable of image file
+    paths or an iterable of already decoded arrays. Files are decoded ahead on 'workers'
+    background threads, at most 'depth' frames ahead of the consumer."""
+
+    if isinstance(source, (str, os.PathLike)):
+        source = list_images(source)
+
+    def decode(item):
+        return read_image(item) if isinstance(item, (str, os.PathLike)) else np.asarray(item)
+
+    return ordered_map(decode, source, workers, depth)
+
+
+def warp_frames(frames, transform, warp=trans.backward_mapping, workers=4, depth=8, **options):
+    """Warps a stream of frames on a pool of 'workers' threads, yielding them in order.
+    'transform' is one 3x3 matrix for every frame or an iterable of per-frame matrices, and
+    'warp' any of the warping functions of transforms.py, called with the extra 'options'
+    (e.g. interpolation='bilinear')."""
+
+    if np.ndim(transform) == 2:
+        jobs = ((frame, transform) for frame in frames)
+    else:
+        jobs = zip(frames, transform)
+
+    def work(job):
+        frame, matrix = job
+        return warp(frame, np.asarray(matrix), **options)
+
+    return ordered_map(work, jobs, workers, depth)
+
+
+def undistort_frames(frames, camera_matrix, dist_coeffs, interpolation='bilinear', workers=4, depth=8):
+    """Undistorts a stream of frames of one camera on a pool of 'workers' threads, yielding them
+    in order. The remap table is built once, for the first frame size, and shared by every worker."""
+
+    def work(frame):
+        table = trans.get_undistort_map(camera_matrix, dist_coeffs, *frame.shape[:2])
+        return table.apply(frame, interpolation)
+
+    return ordered_map(work, frames, workers, depth)
@@ -1,3 +1,6 @@
+import functools
+import weakref
+
 import numpy as np
 
 
@@ -11,98 +14,605 @@ def transform_pixel_nn(x, y, transform):
     return int(np.rint(q[0] / q[2])), int(np.rint(q[1] / q[2]))
 
 
-def forward_mapping(source, transform):
-    """Warps the 'source' image by the given 'transform' using forward mapping."""
-    out = np.zeros_like(source)
-    for y in range(source.shape[0]):
-        for x in range(source.shape[1]):
+def pixel_grid(height, width):
+    """Returns the homogeneous coordinates (x, y, 1) of every pixel of a height x width image
+    as a 3 x (height * width) matrix, in row-major pixel order."""
 
-            u, v = transform_pixel_nn(x,y,transform)
-            if 0 <= u < out.shape[1] and 0 <= v < out.shape[0]:
-                out[v, u, :] = source[y, x, :]
-                
-    return out
+    y, x = np.indices((height, width))
 
+    return np.stack([x.ravel(), y.ravel(), np.ones(height * width, dtype=x.dtype)]).astype(float)
 
-def get_backward_px(x, y, transform):
 
-    p = np.array([x, y, 1]).T
-    
-    q = transform @ p
+def is_affine(transform, tol=1e-12):
+    """True if 'transform' has no perspective part, i.e. its last row is (0, 0, w)."""
 
-    return int(np.rint(q[0] / q[2])), int(np.rint(q[1] / q[2]))
-    
+    return abs(transform[2, 0]) <= tol * abs(transform[2, 2]) and abs(transform[2, 1]) <= tol * abs(transform[2, 2])
 
-def backward_mapping(source, transform):
-    """Warps the 'source' image by the given 'transform' using backward mapping with nearest-neighbour interpolation."""
-    out = np.zeros_like(source)
-    tf_new = np.linalg.inv(transform)
 
-    for y in range(source.shape[0]):
-        for x in range(source.shape[1]):
+def grid_coordinates(transform, height, width):
+    """Returns the transformed coordinates (x', y') of every pixel of a height x width grid as
+    two height x width arrays. Each output coordinate is linear in x and y, so it is generated
+    by stepping along the rows and columns: one vector of per-column steps plus one vector of
+    per-row offsets, added with broadcasting, instead of a 3x3 product per pixel. Affine
+    transforms skip the divide by w altogether."""
 
-            u, v = get_backward_px(x,y,tf_new)
-            if 0 <= u < out.shape[1] and 0 <= v < out.shape[0]:
-                out[y, x, :] = source[v, u, :]
-                
-    return out
+    transform = np.asarray(transform, dtype=float)
+    xs = np.arange(width, dtype=float)
+    ys = np.arange(height, dtype=float)
+
+    if is_affine(transform):
+        transform = transform / transform[2, 2]
+        map_x = np.add.outer(transform[0, 1] * ys + transform[0, 2], transform[0, 0] * xs)
+        map_y = np.add.outer(transform[1, 1] * ys + transform[1, 2], transform[1, 0] * xs)
+        return map_x, map_y
+
+    w = np.add.outer(transform[2, 1] * ys + transform[2, 2], transform[2, 0] * xs)
+    map_x = np.add.outer(transform[0, 1] * ys + transform[0, 2], transform[0, 0] * xs)
+    map_y = np.add.outer(transform[1, 1] * ys + transform[1, 2], transform[1, 0] * xs)
+    map_x /= w
+    map_y /= w
+
+    return map_x, map_y
+
+
+def transform_pixels_nn(transform, height, width):
+    """Vectorised transform_pixel_nn: transforms every pixel coordinate of a height x width image
+    and rounds to the nearest pixel. Returns flat integer arrays (x', y') in row-major order."""
+
+    map_x, map_y = grid_coordinates(transform, height, width)
+
+    return np.rint(map_x).astype(np.intp).ravel(), np.rint(map_y).astype(np.intp).ravel()
+
+
+def _scatter(targets, values, size, collision):
+    """Scatters 'values' (N x C) to the flat pixel indices 'targets' of an image with 'size'
+    pixels. Several values landing on one pixel are resolved by 'collision': 'last' keeps the
+    last one in source order, 'average' their mean and 'max' their per-channel maximum.
+    Returns the (size x C) result and a mask of the pixels that were hit. 'last' and 'max' only
+    copy values and keep their dtype; 'average' is float32 for integer values."""
+
+    dtype = _work_dtype(values.dtype) if collision == 'average' else values.dtype
+    out = np.zeros((size, values.shape[1]), dtype=dtype)
+    hit = np.zeros(size, dtype=bool)
+    hit[targets] = True
+
+    if collision == 'last':
+        # First occurrence in the reversed order is the last one in source order
+        _, first = np.unique(targets[::-1], return_index=True)
+        keep = len(targets) - 1 - first
+        out[targets[keep]] = values[keep]
+    elif collision == 'average':
+        counts = np.bincount(targets, minlength=size)
+        for c in range(values.shape[1]):
+            out[:, c] = np.bincount(targets, weights=values[:, c], minlength=size)
+        out[hit] /= counts[hit, None]
+    elif collision == 'max':
+        out[hit] = np.iinfo(dtype).min if np.issubdtype(dtype, np.integer) else -np.inf
+        np.maximum.at(out, targets, values)
+    else:
+        raise ValueError(f"Unknown collision rule '{collision}', expected 'last', 'average' or 'max'")
+
+    return out, hit
+
+
+def _splat_size(transform, height, width):
+    """Returns the largest distance, in output pixels, between the images of neighbouring
+    source pixels: the footprint a source pixel must cover for the output to have no holes."""
+
+    q = transform @ pixel_grid(height, width)
+    # Jacobian of the perspective divide (u, v) = (q0 / q2, q1 / q2) with respect to (x, y)
+    du = (transform[0, :2, None] * q[2] - transform[2, :2, None] * q[0]) / q[2] ** 2
+    dv = (transform[1, :2, None] * q[2] - transform[2, :2, None] * q[1]) / q[2] ** 2
 
+    return max(int(np.ceil(np.abs(du).sum(axis=0).max())), int(np.ceil(np.abs(dv).sum(axis=0).max())), 1)
 
-def get_bilinear_px(x, y, transform):
 
-    old = np.array([[y],[x],[1]])
-    new = np.dot(transform, old)
+def warped_bounds(transform, height, width, reach=0):
+    """Returns the bounding box (x_min, y_min, x_max, y_max) of a height x width image after
+    'transform', from its four corners, with the image first widened by 'reach' pixels on
+    every side."""
 
-    return new[0], new[1]
+    lo_x, hi_x, lo_y, hi_y = -reach, width - 1 + reach, -reach, height - 1 + reach
+    corners = transform @ np.array([[lo_x, hi_x, lo_x, hi_x], [lo_y, lo_y, hi_y, hi_y], [1, 1, 1, 1]])
+    if np.any(corners[2] * transform[2, 2] <= 0):
+        raise ValueError("The transform maps part of the image through the horizon, its bounds are infinite")
 
+    x = corners[0] / corners[2]
+    y = corners[1] / corners[2]
 
-def backward_mapping_bilinear(source, transform):
-    """Warps the 'source' image by the given 'transform' using backward mapping with bilinear interpolation."""
-    out = np.zeros_like(source)
-    tf_new = np.linalg.inv(transform)
-    for i in range(len(out)):
-        for j in range(len(out[0])):
-            try:
-                y, x = get_bilinear_px(i,j,tf_new)
-                
-                if x >= 0 and y >= 0:
-                    pass
+    return x.min(), y.min(), x.max(), y.max()
+
+
+def fit_transform(transform, height, width):
+    """Returns the transform followed by the translation that moves the warped image's bounding
+    box to the origin, and the (height, width) of an output that holds the whole warped image."""
+
+    x_min, y_min, x_max, y_max = warped_bounds(transform, height, width)
+    x_min, y_min = np.floor(x_min), np.floor(y_min)
+    shift = np.array([[1, 0, -x_min], [0, 1, -y_min], [0, 0, 1]])
+
+    return shift @ transform, (int(np.ceil(y_max) - y_min) + 1, int(np.ceil(x_max) - x_min) + 1)
+
+
+def forward_mapping(source, transform, collision='last', splat=None, fit=False):
+    """Warps the 'source' image by the given 'transform' using forward mapping.
+
+    All pixel coordinates are transformed together and scattered into the output.
+    Source pixels landing on the same output pixel are resolved by 'collision' ('last', the
+    default, keeps the last in row-major source order as the original loop did; 'average' or
+    'max'). 'splat' fills the holes left when the transform magnifies: each source pixel also
+    covers a splat x splat block around its target ('auto' sizes it from the transform), and
+    those blocks only fill pixels that no source pixel maps onto directly.
+
+    The output is the size of the source, or with 'fit' just large enough to hold the whole
+    warped image (see fit_transform)."""
+
+    height, width = source.shape[:2]
+    values = source.reshape(height * width, -1)
+
+    out_h, out_w = height, width
+    if fit:
+        transform, (out_h, out_w) = fit_transform(transform, height, width)
+
+    u, v = transform_pixels_nn(transform, height, width)
+    valid = (0 <= u) & (u < out_w) & (0 <= v) & (v < out_h)
+    out, hit = _scatter(v[valid] * out_w + u[valid], values[valid], out_h * out_w, collision)
+
+    if splat == 'auto':
+        splat = _splat_size(transform, height, width)
+
+    if splat is not None and splat > 1:
+        # One scatter pass per offset of the splat x splat footprint, so memory stays the size
+        # of one image; the passes are combined exactly as one scatter of all offsets would be
+        offsets = np.arange(splat) - (splat - 1) // 2
+        direct = hit.copy()
+        counts = np.zeros(out_h * out_w)
+
+        for dv in offsets:
+            for du in offsets:
+                su, sv = u + du, v + dv
+                inside = (0 <= su) & (su < out_w) & (0 <= sv) & (sv < out_h)
+                targets = sv[inside] * out_w + su[inside]
+                filled, filled_hit = _scatter(targets, values[inside], out_h * out_w, collision)
+
+                # Only pixels no source pixel maps onto directly take splatted values
+                new = filled_hit & ~direct
+                if collision == 'average':
+                    n = np.bincount(targets, minlength=out_h * out_w)[new]
+                    out[new] = (out[new] * counts[new, None] + filled[new] * n[:, None]) / (counts[new] + n)[:, None]
+                    counts[new] += n
+                elif collision == 'max':
+                    first = new & ~hit
+                    out[first] = filled[first]
+                    again = new & hit
+                    out[again] = np.maximum(out[again], filled[again])
                 else:
-                    continue
+                    out[new] = filled[new]
+                hit |= new
+
+    result = np.zeros((out_h, out_w) + source.shape[2:], dtype=source.dtype)
+    result.reshape(out_h * out_w, -1)[hit] = _to_dtype(out[hit], source.dtype)
+
+    return result
+
+
+def _nearest(coords):
+    return np.rint(coords).astype(np.intp), (0,), np.ones((1,) + coords.shape)
+
+
+def _bilinear(coords):
+    base = np.floor(coords)
+    frac = coords - base
+
+    return base.astype(np.intp), (0, 1), np.stack([1 - frac, frac])
+
+
+def _bicubic(coords, a=-0.5):
+    """Keys cubic convolution weights for the four taps around each coordinate."""
+
+    base = np.floor(coords)
+    frac = coords - base
+    # Distances from the taps at offsets -1, 0, 1 and 2
+    d = np.abs(frac[None] - np.array([-1, 0, 1, 2]).reshape(-1, 1))
+    near = ((a + 2) * d - (a + 3)) * d * d + 1
+    far = ((a * d - 5 * a) * d + 8 * a) * d - 4 * a
+    weights = np.where(d <= 1, near, np.where(d < 2, far, 0))
+
+    return base.astype(np.intp), (-1, 0, 1, 2), weights
+
+
+def _lanczos3(coords, a=3):
+    """Lanczos windowed sinc weights for the six taps around each coordinate, normalised to sum to one."""
+
+    base = np.floor(coords)
+    frac = coords - base
+    offsets = np.arange(1 - a, a + 1)
+    d = frac[None] - offsets.reshape(-1, 1)
+    weights = np.sinc(d) * np.sinc(d / a)
+
+    return base.astype(np.intp), tuple(offsets), weights / weights.sum(axis=0)
+
+
+# Each interpolator maps sample coordinates along one axis to (base index, tap offsets, tap
+# weights of shape (taps, N)); taps are applied separably along x and y. New interpolators can
+# be registered here or passed directly to remap.
+INTERPOLATORS = {
+    'nearest': _nearest,
+    'bilinear': _bilinear,
+    'bicubic': _bicubic,
+    'lanczos': _lanczos3,
+}
+
+BORDERS = ('constant', 'edge', 'reflect')
+
+
+def _border_index(indices, size, border):
+    """Maps 'indices' along an axis of length 'size' into the image following 'border'.
+    Returns the indices and a mask of those that were out of bounds."""
+
+    outside = (indices < 0) | (indices >= size)
+
+    if border in ('constant', 'edge'):
+        return np.clip(indices, 0, size - 1), outside
+    if border == 'reflect':
+        # Mirrored about the edge, repeating the edge pixel: d c b a | a b c d | d c b a
+        folded = np.mod(indices, 2 * size)
+        return np.where(folded < size, folded, 2 * size - 1 - folded), outside
+
+    raise ValueError(f"Unknown border '{border}', expected one of {BORDERS}")
+
+
+def _work_dtype(dtype):
+    """Float dtype interpolation of 'dtype' pixels is done in: float32 is exact enough for 8 and
+    16 bit integers and float32 images, anything wider keeps float64."""
+
+    if np.issubdtype(dtype, np.integer) and np.dtype(dtype).itemsize <= 2 or dtype == np.float32:
+        return np.dtype(np.float32)
+
+    return np.dtype(np.float64)
+
+
+def _to_dtype(values, dtype):
+    """Casts interpolated float 'values' to 'dtype', rounding and clipping to its range for integers."""
+
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(values), info.min, info.max).astype(dtype)
+
+    return values.astype(dtype, copy=False)
+
+
+def remap(source, map_x, map_y, interpolation='bilinear', border='constant', cval=0, jacobian=None):
+    """Samples 'source' at the (possibly fractional) coordinates map_x, map_y of every output
+    pixel, gathering whole taps over the frame at once. 'interpolation' is 'nearest', 'bilinear',
+    'bicubic', 'lanczos' or a callable like those in INTERPOLATORS. Coordinates outside the
+    source follow 'border': 'constant' (filled with 'cval'), 'edge' (clamped) or 'reflect'.
+    Returns an array of shape map_x.shape + source.shape[2:] and the dtype of 'source'.
+
+    'trilinear' and 'anisotropic' sample the cached mipmap pyramid of 'source' (see remap_mipmap)
+    and use 'jacobian', the derivatives of the maps along the output axes, to pick the level;
+    without it the derivatives are estimated from the maps by finite differences."""
+
+    if border not in BORDERS:
+        raise ValueError(f"Unknown border '{border}', expected one of {BORDERS}")
+
+    out_shape = np.shape(map_x) + source.shape[2:]
+
+    if isinstance(interpolation, str) and interpolation in MIPMAP_MODES:
+        if jacobian is None:
+            jacobian = map_jacobian(map_x, map_y)
+        samples = remap_mipmap(get_pyramid(source), map_x, map_y, jacobian, interpolation, border, cval)
+        return _to_dtype(samples, source.dtype).reshape(out_shape)
+
+    interpolate = INTERPOLATORS[interpolation] if isinstance(interpolation, str) else interpolation
+    samples = _sample(source, map_x, map_y, interpolate, border, cval)
+
+    return _to_dtype(samples, source.dtype).reshape(out_shape)
+
+
+def _sample(source, map_x, map_y, interpolate, border='constant', cval=0):
+    """Gathers and weights the interpolator taps of 'source' at map_x, map_y. Returns an
+    (N x channels) array: the plain source values for single-tap interpolators, float otherwise."""
+
+    height, width = source.shape[:2]
+    values = source.reshape(height * width, -1)
+
+    base_x, offsets_x, weights_x = interpolate(np.ravel(map_x))
+    base_y, offsets_y, weights_y = interpolate(np.ravel(map_y))
+
+    def fetch(dy, dx):
+        rows, rows_outside = _border_index(base_y + dy, height, border)
+        cols, cols_outside = _border_index(base_x + dx, width, border)
+        taps = values[rows * width + cols]
+        if border == 'constant':
+            taps = np.where((rows_outside | cols_outside)[:, None], np.asarray(cval, dtype=taps.dtype), taps)
+        return taps
+
+    # A single tap is a plain copy, no weighting needed
+    if len(offsets_x) == 1 and len(offsets_y) == 1:
+        return fetch(offsets_y[0], offsets_x[0])
+
+    dtype = _work_dtype(source.dtype)
+    weights_x = weights_x.astype(dtype, copy=False)
+    weights_y = weights_y.astype(dtype, copy=False)
+
+    accumulator = np.zeros((base_x.size, values.shape[1]), dtype=dtype)
+    for i, dy in enumerate(offsets_y):
+        for j, dx in enumerate(offsets_x):
+            accumulator += (weights_y[i] * weights_x[j])[:, None] * fetch(dy, dx)
+
+    return accumulator
+
+
+MIPMAP_MODES = ('trilinear', 'anisotropic')
+
+
+class ImagePyramid():
+    """Mipmap pyramid of an image. Level 0 is the image itself and every further level halves
+    the previous one with a 2x2 box filter (odd sizes repeat their last row or column). Levels
+    are built lazily, the first time a warp needs them, and kept for later warps.
+
+    Only a weak reference to the image is held, so a cached pyramid does not keep it alive.
+    The pyramid does not notice if the image is modified in place; make a new one if it is."""
+
+    def __init__(self, image):
+        self._image = weakref.ref(image)
+        self.levels = {}
+        self.n_levels = int(np.log2(max(image.shape[:2]))) + 1
+
+    def level(self, k):
+        """Returns level 'k', building it and any missing levels below it."""
+
+        if k == 0:
+            return self._image()
+
+        if k not in self.levels:
+            below = self.level(k - 1).astype(np.float32, copy=False)
+            odd = ((0, below.shape[0] % 2), (0, below.shape[1] % 2)) + ((0, 0),) * (below.ndim - 2)
+            if any(odd[0] + odd[1]):
+                below = np.pad(below, odd, mode='edge')
+            self.levels[k] = 0.25 * (below[0::2, 0::2] + below[1::2, 0::2] + below[0::2, 1::2] + below[1::2, 1::2])
+
+        return self.levels[k]
+
+
+# id(image) -> (weak reference to the image, its pyramid)
+_pyramids = {}
+
+
+def get_pyramid(image):
+    """Returns the cached ImagePyramid of 'image', creating it on first use. The cache entry
+    is dropped when the image is garbage collected."""
+
+    key = id(image)
+    entry = _pyramids.get(key)
+    if entry is not None and entry[0]() is image:
+        return entry[1]
+
+    pyramid = ImagePyramid(image)
+    _pyramids[key] = (weakref.ref(image, lambda _, key=key: _pyramids.pop(key, None)), pyramid)
+
+    return pyramid
+
+
+def map_jacobian(map_x, map_y):
+    """Estimates the derivatives (du/dx, du/dy, dv/dx, dv/dy) of coordinate maps along the
+    output columns (x) and rows (y) by finite differences."""
 
-                alpha = y - np.floor(y)
-                beta = x - np.floor(x)
-                
-                try:
-                    f1 = source[int(np.floor(x))][int(np.floor(y))]
-                except:
-                    f1 = (0,0,0)
+    def derivative(values, axis):
+        if values.shape[axis] < 2:
+            return np.zeros_like(values)
+        return np.gradient(values, axis=axis)
 
-                try:
-                    f2 = source[int(np.floor(x))][int(np.ceil(y))]
-                except:
-                    f2 = (0,0,0)
+    return derivative(map_x, 1), derivative(map_x, 0), derivative(map_y, 1), derivative(map_y, 0)
 
-                try:
-                    f3 = source[int(np.ceil(x))][int(np.floor(y))]
-                except:
-                    f3 = (0,0,0)
 
-                try:
-                    f4 = source[int(np.ceil(x))][int(np.ceil(y))]
-                except:
-                    f4 = (0,0,0)
+def grid_jacobian(transform, map_x, map_y):
+    """Exact derivatives (du/dx, du/dy, dv/dx, dv/dy) of the maps that grid_coordinates returns
+    for 'transform'. They are constants for affine transforms."""
 
-                f12 = ((1-alpha) * f1) + (alpha * f2)
-                f34 = ((1-alpha) * f3) + (alpha * f4)
+    t = np.asarray(transform, dtype=float) / transform[2, 2]
+    if is_affine(t):
+        return t[0, 0], t[0, 1], t[1, 0], t[1, 1]
 
-                out[i][j] = ((1-beta) * f12) + (beta * f34)
+    height, width = np.shape(map_x)
+    w = np.add.outer(t[2, 1] * np.arange(height) + 1, t[2, 0] * np.arange(width))
 
-            except:
+    return _jacobian(t, map_x, map_y, w)
+
+
+def _jacobian(t, u, v, w):
+    """Derivatives of the projective map 't' (normalised, t[2, 2] = 1) at the mapped points
+    u, v with homogeneous weights w."""
+
+    return ((t[0, 0] - t[2, 0] * u) / w, (t[0, 1] - t[2, 1] * u) / w,
+            (t[1, 0] - t[2, 0] * v) / w, (t[1, 1] - t[2, 1] * v) / w)
+
+
+def _sample_levels(pyramid, x, y, levels, border, cval):
+    """Bilinearly samples every point at its own pyramid level, one gather per level present."""
+
+    source = pyramid.level(0)
+    out = np.zeros((x.size, int(np.prod(source.shape[2:]))), dtype=_work_dtype(source.dtype))
+
+    for level in np.unique(levels):
+        mask = levels == level
+        # Pixel centres of level L sit at (x + 0.5) / 2^L - 0.5 in level L coordinates
+        scale = 0.5 ** level
+        out[mask] = _sample(pyramid.level(level), (x[mask] + 0.5) * scale - 0.5, (y[mask] + 0.5) * scale - 0.5,
+                            _bilinear, border, cval)
+
+    return out
+
+
+def _sample_trilinear(pyramid, x, y, lod, border, cval):
+    """Blends bilinear samples of the two pyramid levels around the fractional level 'lod'."""
+
+    lod = np.clip(lod, 0, pyramid.n_levels - 1)
+    lower = np.floor(lod).astype(int)
+    upper = np.minimum(lower + 1, pyramid.n_levels - 1)
+    below = _sample_levels(pyramid, x, y, lower, border, cval)
+    blend = (lod - lower).astype(below.dtype)[:, None]
+
+    return (1 - blend) * below + blend * _sample_levels(pyramid, x, y, upper, border, cval)
+
+
+def remap_mipmap(pyramid, map_x, map_y, jacobian, mode='trilinear', border='constant', cval=0, max_anisotropy=8):
+    """Samples an ImagePyramid at map_x, map_y for anti-aliased minification. The level of
+    every output pixel comes from the size of its footprint in the source, given by 'jacobian'
+    (du/dx, du/dy, dv/dx, dv/dy). 'trilinear' picks the level from the longer footprint axis;
+    'anisotropic' picks it from the shorter axis and averages up to 'max_anisotropy' trilinear
+    probes spread along the longer one, keeping detail under strongly oblique warps.
+    Returns an (N x channels) float array."""
+
+    x = np.ravel(map_x)
+    y = np.ravel(map_y)
+    du_dx, du_dy, dv_dx, dv_dy = (np.broadcast_to(d, np.shape(map_x)).ravel() for d in jacobian)
+
+    # Footprint lengths of one output pixel step along x and along y, in source pixels
+    length_x = np.hypot(du_dx, dv_dx)
+    length_y = np.hypot(du_dy, dv_dy)
+
+    if mode == 'trilinear':
+        lod = np.log2(np.maximum(np.maximum(length_x, length_y), 1e-12))
+        return _sample_trilinear(pyramid, x, y, lod, border, cval)
+
+    if mode != 'anisotropic':
+        raise ValueError(f"Unknown mipmap mode '{mode}', expected one of {MIPMAP_MODES}")
+
+    major_is_x = length_x >= length_y
+    major = np.where(major_is_x, length_x, length_y)
+    minor = np.maximum(np.where(major_is_x, length_y, length_x), 1e-12)
+    step_u = np.where(major_is_x, du_dx, du_dy)
+    step_v = np.where(major_is_x, dv_dx, dv_dy)
+
+    # One probe count for the whole frame keeps the sampling vectorised
+    probes = int(np.clip(np.ceil(np.max(major / minor)), 1, max_anisotropy))
+    lod = np.log2(np.maximum(np.maximum(major / probes, minor), 1e-12))
+
+    out = 0
+    for i in range(probes):
+        t = (i + 0.5) / probes - 0.5
+        out = out + _sample_trilinear(pyramid, x + t * step_u, y + t * step_v, lod, border, cval)
+
+    return out / probes
+
+
+def backward_coordinates(transform, height, width):
+    """Returns the source coordinates (map_x, map_y), each height x width, that every output
+    pixel maps back to under 'transform'."""
+
+    return grid_coordinates(np.linalg.inv(transform), height, width)
+
+
+def get_backward_px(x, y, transform):
+
+    p = np.array([x, y, 1]).T
+    
+    q = transform @ p
+
+    return int(np.rint(q[0] / q[2])), int(np.rint(q[1] / q[2]))
+    
+
+def _tile_misses_source(inverse, rows, cols, height, width, margin):
+    """True if the output tile (rows, cols) certainly maps outside the source: all four of its
+    corners land beyond the same side of the source, widened by 'margin' pixels."""
+
+    corners = inverse @ np.array([[cols.start, cols.stop - 1, cols.start, cols.stop - 1],
+                                  [rows.start, rows.start, rows.stop - 1, rows.stop - 1],
+                                  [1, 1, 1, 1]])
+    if np.any(corners[2] * inverse[2, 2] <= 0):
+        return False
+
+    x = corners[0] / corners[2]
+    y = corners[1] / corners[2]
+
+    return (np.all(x < -margin) or np.all(x > width - 1 + margin) or
+            np.all(y < -margin) or np.all(y > height - 1 + margin))
+
+
+def backward_mapping(source, transform, interpolation='nearest', border='constant', cval=0, fit=False,
+                     tile_size=256):
+    """Warps the 'source' image by the given 'transform' using backward mapping with nearest-neighbour
+    interpolation by default, or any 'interpolation' and 'border' accepted by remap. Shrinking
+    warps alias with point sampling; 'trilinear' or 'anisotropic' sample the source's mipmap
+    pyramid at the level the local Jacobian of the transform calls for instead.
+
+    The output is the size of the source, or with 'fit' just large enough to hold the whole
+    warped image (see fit_transform). With the 'constant' border only the bounding box of the
+    warped image is evaluated, in tiles of 'tile_size', skipping tiles that cannot reach the
+    source; everything else is filled with 'cval' directly."""
+
+    height, width = source.shape[:2]
+
+    out_h, out_w = height, width
+    if fit:
+        transform, (out_h, out_w) = fit_transform(transform, height, width)
+
+    inverse = np.linalg.inv(transform)
+    mipmap = isinstance(interpolation, str) and interpolation in MIPMAP_MODES
+
+    def sample(tile_inverse, tile_h, tile_w):
+        map_x, map_y = grid_coordinates(tile_inverse, tile_h, tile_w)
+        jacobian = grid_jacobian(tile_inverse, map_x, map_y) if mipmap else None
+        return remap(source, map_x, map_y, interpolation, border, cval, jacobian)
+
+    if border != 'constant':
+        # Every output pixel samples some source pixel, nothing can be skipped
+        return sample(inverse, out_h, out_w)
+
+    # How far outside the source, in source pixels, a sample point can still pick up a pixel
+    if mipmap:
+        # The footprint of a pixel spans about as many source pixels as the Jacobian is long
+        # (largest at the frame corners for a projective map), plus the coarse level's taps
+        t = inverse / inverse[2, 2]
+        q = t @ np.array([[0, out_w - 1, 0, out_w - 1], [0, 0, out_h - 1, out_h - 1], [1, 1, 1, 1]])
+        jacobian = _jacobian(t, q[0] / q[2], q[1] / q[2], q[2])
+        reach = int(np.ceil(np.max(np.abs(jacobian)) * 4)) + 2
+    else:
+        interpolate = INTERPOLATORS[interpolation] if isinstance(interpolation, str) else interpolation
+        offsets = interpolate(np.zeros(1))[1]
+        # Nearest rounds, so points up to half a pixel outside still land on the edge pixels
+        reach = 0.5 if len(offsets) == 1 else max(abs(offset) for offset in offsets) + 1
+
+    out = np.empty((out_h, out_w) + source.shape[2:], dtype=source.dtype)
+    out[...] = cval
+
+    try:
+        # The source widened by the reach, mapped into the output, bounds every pixel drawn;
+        # a zoom scales the reach along with everything else
+        x_min, y_min, x_max, y_max = warped_bounds(transform, height, width, reach)
+        row_range = range(max(int(np.floor(y_min)) - 1, 0), min(int(np.ceil(y_max)) + 2, out_h))
+        col_range = range(max(int(np.floor(x_min)) - 1, 0), min(int(np.ceil(x_max)) + 2, out_w))
+    except ValueError:
+        row_range, col_range = range(out_h), range(out_w)
+
+    for r in range(row_range.start, row_range.stop, tile_size):
+        for c in range(col_range.start, col_range.stop, tile_size):
+            rows = slice(r, min(r + tile_size, row_range.stop))
+            cols = slice(c, min(c + tile_size, col_range.stop))
+            if _tile_misses_source(inverse, rows, cols, height, width, reach):
                 continue
+
+            # Coordinates of this tile: the inverse transform after shifting the tile to the origin
+            offset = np.array([[1, 0, c], [0, 1, r], [0, 0, 1]])
+            out[rows, cols] = sample(inverse @ offset, rows.stop - rows.start, cols.stop - cols.start)
+
     return out
 
 
+def backward_mapping_bilinear(source, transform, border='constant', cval=0):
+    """Warps the 'source' image by the given 'transform' using backward mapping with bilinear interpolation.
+
+    Note: the original loop version of this function read the transformed (x, y) as (row, col),
+    so its output was transposed relative to backward_mapping and even a pure translation
+    sampled the wrong pixels. Pixels are now addressed as (x = column, y = row) like every other
+    warp here, so results differ from that version for any transform that is not symmetric in
+    x and y."""
+
+    return backward_mapping(source, transform, 'bilinear', border, cval)
+
+
 def undistort_point(u, v, camera_matrix, dist_coeffs):
     """Undistorts a pixel's coordinates (u, v) using the given camera matrix and
     distortion coefficients. Returns a tuple (u', v')."""
@@ -131,44 +641,156 @@ def undistort_point(u, v, camera_matrix, dist_coeffs):
     return uprime, vprime
 
 
-def undistort_image_vectorised(image, camera_matrix, dist_coeffs):
-    """Undistorts an image using the given camera matrix and distortion coefficients.
-    Use vectorised operations to avoid slow for loops."""
-    out = np.zeros_like(image)
-    v = (np.array([([i] * len(image[0])) for i in range(len(image))])).flatten()
-    u = (np.array([(list(range(len(image[0]))))] * len(image))).flatten()
-    
+def distort_coordinates(u, v, camera_matrix, dist_coeffs):
+    """Vectorised undistort_point: maps arrays of pixel coordinates (u, v) through the radial
+    distortion model, returning arrays (u', v') of the same shape."""
+
     fx = camera_matrix[0][0]
     fy = camera_matrix[1][1]
     px = camera_matrix[0][2]
     py = camera_matrix[1][2]
-    k1 = dist_coeffs[0]
-    k2 = dist_coeffs[1]
-    k3 = dist_coeffs[2]
-    
+    k1, k2, k3 = dist_coeffs[:3]
+
     x = (u - px) / fx
     y = (v - py) / fy
-    
-    xsq = x**2
-    ysq = y**2
+    r2 = x * x + y * y
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
 
-    r = np.sqrt(xsq + ysq)
-    
-    arr = [(1 + (k1 * rr**2) + (k2 * rr**4) + (k3 * rr**6)) for rr in r]
+    return x * radial * fx + px, y * radial * fy + py
+
+
+class UndistortMap():
+    """Precomputed remap table from every output pixel to the distorted source pixel it samples,
+    built once per camera and image size and then applied to each frame with a gather.
 
-    xprime = [np.dot(x[n], arr[n]) for n in range(len(x))]
-    yprime = [np.dot(y[n], arr[n]) for n in range(len(y))]
-    
-    uprime = (np.array([(np.dot(xprime[n], fx) + px) for n in range(len(xprime))])).reshape(len(image), len(image[0]))
-    vprime = (np.array([(np.dot(yprime[n], fy) + py) for n in range(len(yprime))])).reshape(len(image), len(image[0]))
-    
-    for i in range(len(image)):
-        for j in range(len(image[0])):
-            
-            try:
-                out[i][j] = image[int(vprime[i][j])][int(uprime[i][j])]
-            except:
-                continue
+    Stored compactly as fixed point: the integer part of the source coordinates as int16
+    (clamped just outside the image) and the fractional part in 1/256ths as uint8, six bytes
+    per pixel instead of sixteen for a pair of float64 maps."""
 
-    return out
+    FRACTION_SCALE = 256
+
+    def __init__(self, map_x, map_y, frac_x, frac_y, source_shape):
+        self.map_x = map_x #H,W int16 integer part of the source x coordinate
+        self.map_y = map_y #H,W int16 integer part of the source y coordinate
+        self.frac_x = frac_x #H,W uint8 fractional part of x, in 1/FRACTION_SCALE
+        self.frac_y = frac_y #H,W uint8 fractional part of y, in 1/FRACTION_SCALE
+        self.source_shape = tuple(source_shape) #(height, width) of the frames it applies to
+        self._taps = {}
+
+    @classmethod
+    def from_coordinates(cls, map_x, map_y, source_shape):
+        """Quantises float source coordinate maps into a table."""
+
+        height, width = source_shape[:2]
+        base_x = np.floor(map_x)
+        base_y = np.floor(map_y)
+        frac_x = np.minimum(np.rint((map_x - base_x) * cls.FRACTION_SCALE), cls.FRACTION_SCALE - 1)
+        frac_y = np.minimum(np.rint((map_y - base_y) * cls.FRACTION_SCALE), cls.FRACTION_SCALE - 1)
+
+        # Anything beyond one pixel outside the image samples the border, so int16 always suffices
+        base_x = np.nan_to_num(base_x, nan=-2).clip(-2, width + 1)
+        base_y = np.nan_to_num(base_y, nan=-2).clip(-2, height + 1)
+
+        return cls(base_x.astype(np.int16), base_y.astype(np.int16),
+                   np.nan_to_num(frac_x).astype(np.uint8), np.nan_to_num(frac_y).astype(np.uint8), source_shape[:2])
+
+    def save(self, path):
+        """Saves the table to a .npz file."""
+
+        np.savez_compressed(path, map_x=self.map_x, map_y=self.map_y, frac_x=self.frac_x, frac_y=self.frac_y,
+                            source_shape=np.array(self.source_shape))
+
+    @classmethod
+    def load(cls, path):
+        """Loads a table saved with save()."""
+
+        with np.load(path) as data:
+            return cls(data['map_x'], data['map_y'], data['frac_x'], data['frac_y'],
+                       tuple(int(n) for n in data['source_shape']))
+
+    def _tap(self, dy, dx):
+        """Flat source index and out-of-bounds mask of the tap at offset (dy, dx) from the integer
+        coordinates ('round' rounds by the fractional part instead), computed on first use and
+        kept for every later frame."""
+
+        key = (dy, dx)
+        if key not in self._taps:
+            height, width = self.source_shape
+            if dy == 'round':
+                dy = self.frac_y >= self.FRACTION_SCALE // 2
+                dx = self.frac_x >= self.FRACTION_SCALE // 2
+            rows = self.map_y.astype(np.intp) + dy
+            cols = self.map_x.astype(np.intp) + dx
+            outside = (rows < 0) | (rows >= height) | (cols < 0) | (cols >= width)
+            index = np.clip(rows, 0, height - 1) * width + np.clip(cols, 0, width - 1)
+            self._taps[key] = index.ravel(), outside.ravel()
+
+        return self._taps[key]
+
+    def _gather(self, values, dy, dx, cval):
+        index, outside = self._tap(dy, dx)
+        taps = values[index]
+        taps[outside] = cval
+
+        return taps
+
+    def apply(self, image, interpolation='nearest', cval=0):
+        """Undistorts one frame. 'interpolation' is 'nearest', 'bilinear' or 'floor' (the source
+        pixel at the floor of the coordinate); source pixels outside the frame are filled with
+        'cval'.
+
+        Note: 'floor' is close to, but not the same as, the original loop version of
+        undistort_image_vectorised. That version truncated with int(), so coordinates in (-1, 0)
+        sampled row or column 0, and negative indices wrapped around to the opposite edge of the
+        image through Python indexing. Both cases now give 'cval'."""
+
+        height, width = self.source_shape
+        values = image.reshape(height * width, -1)
+        out_shape = self.map_x.shape + image.shape[2:]
+
+        if interpolation == 'floor':
+            return self._gather(values, 0, 0, cval).reshape(out_shape)
+
+        if interpolation == 'nearest':
+            return self._gather(values, 'round', 'round', cval).reshape(out_shape)
+
+        if interpolation == 'bilinear':
+            wx = (self.frac_x.ravel() / np.float32(self.FRACTION_SCALE))[:, None]
+            wy = (self.frac_y.ravel() / np.float32(self.FRACTION_SCALE))[:, None]
+            top = self._gather(values, 0, 0, cval) * (1 - wx) + self._gather(values, 0, 1, cval) * wx
+            bottom = self._gather(values, 1, 0, cval) * (1 - wx) + self._gather(values, 1, 1, cval) * wx
+            return _to_dtype(top * (1 - wy) + bottom * wy, image.dtype).reshape(out_shape)
+
+        raise ValueError(f"Unknown interpolation '{interpolation}', expected 'nearest', 'bilinear' or 'floor'")
+
+
+def build_undistort_map(camera_matrix, dist_coeffs, height, width):
+    """Builds the UndistortMap of a camera for height x width frames."""
+
+    v, u = np.indices((height, width), dtype=float)
+    map_x, map_y = distort_coordinates(u, v, np.asarray(camera_matrix, dtype=float), np.asarray(dist_coeffs))
+
+    return UndistortMap.from_coordinates(map_x, map_y, (height, width))
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_undistort_map(camera_matrix, dist_coeffs, height, width):
+    return build_undistort_map(np.array(camera_matrix), np.array(dist_coeffs), height, width)
+
+
+def get_undistort_map(camera_matrix, dist_coeffs, height, width):
+    """Returns the UndistortMap for a camera and frame size, building it only the first time."""
+
+    camera_matrix = tuple(map(tuple, np.asarray(camera_matrix, dtype=float)))
+    dist_coeffs = tuple(np.asarray(dist_coeffs, dtype=float).ravel())
+
+    return _cached_undistort_map(camera_matrix, dist_coeffs, height, width)
+
+
+def undistort_image_vectorised(image, camera_matrix, dist_coeffs, interpolation='floor'):
+    """Undistorts an image using the given camera matrix and distortion coefficients.
+    The remap table is built once per camera and frame size and reused for later frames."""
+
+    table = get_undistort_map(camera_matrix, dist_coeffs, *image.shape[:2])
 
+    return table.apply(image, interpolation)
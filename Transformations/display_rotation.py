@@ -15,6 +15,10 @@ p = np.array([[-1,  1, 1, -1, -1],
 point = (2, 3)
 scale_factor = 1.5
 
+# Precompute the polygon of every frame: step=0..29 to theta=0..90ish for 90 degree rotation.
+angles = np.arange(30) * 3
+frames = trans.apply_transforms(trans.rotation_scaling_and_translation(angles, scale_factor, point), p)
+
 # Prepare a figure for animation.
 fig, ax = plt.subplots()
 ax.set_xlim((-2, 6))
@@ -28,13 +32,7 @@ def init():
     return (line,)
 
 def animate(step):
-    # Convert step=0..29 to theta=0..90ish for 90 degree rotation.
-    angle = step * 3
-
-    # Apply the transformation.
-    transform = trans.rotation_scaling_and_translation(angle, scale_factor, point)
-    pprime = transform @ p
-    pprime /= pprime[2,:]
+    pprime = frames[step]
 
     # Update coordinates of the polygon.
     line.set_data(pprime[0,:], pprime[1,:])
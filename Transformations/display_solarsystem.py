@@ -14,6 +14,14 @@ moon1 = trans.scaling(0.3) @ earth
 moon2 = trans.scaling(0.2) @ earth
 moon3 = trans.scaling(0.1) @ earth
 
+# Put the Earth and moons into the solar system for every frame at once:
+# step=0..99 to theta=0..360(ish) for 360 degree rotation.
+worlds = solar.solar_system().evaluate(np.arange(100) / 100 * 360)
+p_earth = trans.apply_transforms(worlds['earth'], earth)
+p_moon1 = trans.apply_transforms(worlds['moon1'], moon1)
+p_moon2 = trans.apply_transforms(worlds['moon2'], moon2)
+p_moon3 = trans.apply_transforms(worlds['moon3'], moon3)
+
 # Prepare a figure for animation.
 fig, ax = plt.subplots(figsize=[8, 8])
 ax.set_xlim((-6, 6))
@@ -32,20 +40,11 @@ def init_earth_and_moons():
     return (earth_line, moon1_line, moon2_line, moon3_line)
 
 def animate_earth_and_moons(step):
-    # Convert step=0..99 to theta=0..360(ish) for 360 degree rotation.
-    theta = step / 100 * 360
-
-    # Put the Earth and moons into the solar system.
-    p_earth = solar.transform_earth(theta) @ earth; p_earth /= p_earth[2,:]
-    p_moon1 = solar.transform_moon1(theta) @ moon1; p_moon1 /= p_moon1[2,:]
-    p_moon2 = solar.transform_moon2(theta) @ moon2; p_moon2 /= p_moon2[2,:]
-    p_moon3 = solar.transform_moon3(theta) @ moon3; p_moon3 /= p_moon3[2,:]
-
     # Update coordinates of all polygons.
-    earth_line.set_data(p_earth[0,:], p_earth[1,:])
-    moon1_line.set_data(p_moon1[0,:], p_moon1[1,:])
-    moon2_line.set_data(p_moon2[0,:], p_moon2[1,:])
-    moon3_line.set_data(p_moon3[0,:], p_moon3[1,:])
+    earth_line.set_data(p_earth[step, 0,:], p_earth[step, 1,:])
+    moon1_line.set_data(p_moon1[step, 0,:], p_moon1[step, 1,:])
+    moon2_line.set_data(p_moon2[step, 0,:], p_moon2[step, 1,:])
+    moon3_line.set_data(p_moon3[step, 0,:], p_moon3[step, 1,:])
     return (earth_line, moon1_line, moon2_line, moon3_line)
 
 anim_earth_and_moons = animation.FuncAnimation(fig, animate_earth_and_moons,
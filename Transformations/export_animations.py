@@ -0,0 +1,66 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import transforms as trans
+import solar
+import rasterizer as raster
+
+
+# A 2D polygon: a square of 2 by 2 units, in homogeneous coordinates, as in the display scripts.
+square = np.array([[-1,  1, 1, -1, -1],
+                   [-1, -1, 1,  1, -1],
+                   [ 1,  1, 1,  1,  1]])
+
+
+def rotation_polygons(n_frames):
+    """The square of display_rotation.py rotating about (2, 3), for every frame."""
+
+    angles = np.arange(n_frames) * 90 / n_frames
+    transforms = trans.rotation_scaling_and_translation(angles, 1.5, (2, 3))
+
+    return [trans.apply_transforms(transforms, square)], ['b'], (-2, 6, -2, 6)
+
+
+def solar_polygons(n_frames):
+    """The Earth and moons of display_solarsystem.py over one revolution."""
+
+    worlds = solar.solar_system().evaluate(np.arange(n_frames) / n_frames * 360)
+    bodies = [('earth', 1, 'b'), ('moon1', 0.3, 'k'), ('moon2', 0.2, 'g'), ('moon3', 0.1, 'r')]
+    polygons = [trans.apply_transforms(worlds[name], trans.scaling(size) @ square) for name, size, _ in bodies]
+
+    return polygons, [colour for _, _, colour in bodies], (-6, 6, -6, 6)
+
+
+SCENES = {
+    'rotation': rotation_polygons,
+    'solar': solar_polygons,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the transformation animations headless to files.')
+    parser.add_argument('scene', choices=list(SCENES))
+    parser.add_argument('output', help="'.raw' file, or a frame pattern such as 'out/frame_{:04d}.ppm'")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--size', type=int, default=480)
+    parser.add_argument('--line-width', type=float, default=2.0)
+    parser.add_argument('--fill', action='store_true')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    polygons, colours, extent = SCENES[args.scene](args.frames)
+    frames = raster.render_frames(polygons, colours, (args.size, args.size), extent, args.fill, args.line_width)
+    rendered = time.perf_counter()
+    count = raster.write_frames(frames, args.output)
+    written = time.perf_counter()
+
+    print(f"{count} frames of {args.size}x{args.size}: rendered at {count / (rendered - start):.0f} fps, "
+          f"written at {count / (written - rendered):.0f} fps", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
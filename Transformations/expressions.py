@@ -0,0 +1,197 @@
+import numpy as np
+import transforms as trans
+
+
+class Param():
+    """A named parameter of a transform expression, optionally multiplied by a constant, e.g.
+    Param('theta') * 2. Its value is looked up in the parameters an expression is applied with."""
+
+    def __init__(self, name, factor=1):
+        self.name = name
+        self.factor = factor
+
+    def __mul__(self, factor):
+        return Param(self.name, self.factor * factor)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self * -1
+
+    def __call__(self, params):
+        if self.name not in params:
+            raise KeyError(f"No value given for parameter '{self.name}'")
+        return self.factor * np.asarray(params[self.name])
+
+    def __repr__(self):
+        return self.name if self.factor == 1 else f'{self.factor}*{self.name}'
+
+
+def _value(term, params):
+    return term(params) if isinstance(term, Param) else np.asarray(term)
+
+
+class Transform():
+    """A lazy 2-D transform expression. Composing with '@' only builds an expression tree;
+    the tree is simplified and fused into a single matrix when it is evaluated with matrix()
+    or apply(), and that matrix is memoised per set of parameter values."""
+
+    memo_size = 256
+
+    # Makes 'array @ expression' defer to __rmatmul__ instead of NumPy's matmul
+    __array_ufunc__ = None
+
+    def __matmul__(self, other):
+        if not isinstance(other, Transform):
+            other = Matrix(other)
+        return Compose([self, other])
+
+    def __rmatmul__(self, other):
+        return Compose([Matrix(other), self])
+
+    def factors(self):
+        """The leaf transforms of the expression, in product order."""
+        return [self]
+
+    def simplify(self):
+        """Returns an equivalent expression with adjacent factors merged in closed form:
+        rotations add their angles, translations their offsets and scalings multiply, and a
+        scaling is moved past a rotation (uniform scaling commutes with rotation) so every run
+        of rotations and scalings collapses into one scaling and one rotation."""
+
+        merged = []
+        for factor in self.factors():
+            if merged and isinstance(factor, (Rotate, Scale)):
+                # Gather the trailing run of rotations and scalings and rebuild it as one of each
+                run = [factor]
+                while merged and isinstance(merged[-1], (Rotate, Scale)):
+                    run.insert(0, merged.pop())
+                scales = [term for f in run if isinstance(f, Scale) for term in f.terms]
+                angles = [term for f in run if isinstance(f, Rotate) for term in f.terms]
+                merged += ([Scale(*scales)] if scales else []) + ([Rotate(*angles)] if angles else [])
+            elif merged and isinstance(factor, Translate) and isinstance(merged[-1], Translate):
+                merged.append(Translate(*merged.pop().terms, *factor.terms))
+            else:
+                merged.append(factor)
+
+        return merged[0] if len(merged) == 1 else Compose(merged)
+
+    def matrix(self, **params):
+        """Fuses the expression into one 3x3 matrix (an (N, 3, 3) stack when a parameter is an
+        array of N values) for the given parameter values. The result is read-only; copy it
+        before modifying it."""
+
+        try:
+            key = tuple(sorted((name, np.asarray(value).tobytes(), np.shape(value), np.asarray(value).dtype.str)
+                               for name, value in params.items()))
+        except TypeError:
+            key = None
+
+        memo = self.__dict__.setdefault('_memo', {})
+        if key is not None and key in memo:
+            return memo[key]
+
+        if '_simplified' not in self.__dict__:
+            self._simplified = self.simplify().factors()
+        matrix = _fuse(self._simplified, params)
+
+        if key is not None:
+            # The memoised matrix is shared by every later call, so it must not be modified
+            matrix.flags.writeable = False
+            if len(memo) >= self.memo_size:
+                memo.pop(next(iter(memo)))
+            memo[key] = matrix
+
+        return matrix
+
+    def apply(self, points, **params):
+        """Applies the fused expression to homogeneous 'points' as trans.apply_transforms does."""
+
+        return trans.apply_transforms(self.matrix(**params), points)
+
+
+class Compose(Transform):
+    """The product of several transforms, the first one applied last as with matrices."""
+
+    def __init__(self, transforms):
+        self.transforms = list(transforms)
+
+    def factors(self):
+        return [leaf for transform in self.transforms for leaf in transform.factors()]
+
+    def __repr__(self):
+        return ' @ '.join(map(repr, self.factors()))
+
+
+class Rotate(Transform):
+    """Anti-clockwise rotation about the origin by the sum of the given angles, in degrees."""
+
+    def __init__(self, *terms):
+        self.terms = terms
+
+    def similarity(self, params):
+        return np.exp(1j * np.radians(sum(_value(term, params) for term in self.terms))), 0
+
+    def __repr__(self):
+        return f"Rotate({' + '.join(map(repr, self.terms))})"
+
+
+class Scale(Transform):
+    """Uniform scaling about the origin by the product of the given factors."""
+
+    def __init__(self, *terms):
+        self.terms = terms
+
+    def similarity(self, params):
+        return np.prod([_value(term, params) for term in self.terms], axis=0) + 0j, 0
+
+    def __repr__(self):
+        return f"Scale({' * '.join(map(repr, self.terms))})"
+
+
+class Translate(Transform):
+    """Translation by the sum of the given (x, y) offsets."""
+
+    def __init__(self, *terms):
+        self.terms = terms
+
+    def similarity(self, params):
+        offset = sum(_value(term, params) for term in self.terms)
+        return 1 + 0j, offset[..., 0] + 1j * offset[..., 1]
+
+    def __repr__(self):
+        return f"Translate({' + '.join(map(repr, self.terms))})"
+
+
+class Matrix(Transform):
+    """A fixed 3x3 matrix (or stack of them), for anything that is not a similarity transform."""
+
+    def __init__(self, matrix):
+        self.value = np.asarray(matrix)
+
+    def __repr__(self):
+        return f'Matrix({self.value.tolist()})'
+
+
+def _fuse(factors, params):
+    """Multiplies out simplified factors. Rotations, scalings and translations compose in closed
+    form as complex numbers, x -> z * x + t, without building their matrices; only Matrix
+    factors need an actual matrix product."""
+
+    matrix = None
+    z, t = 1 + 0j, 0j
+
+    for factor in factors + [None]:
+        if factor is not None and not isinstance(factor, Matrix):
+            z_next, t_next = factor.similarity(params)
+            z, t = z * z_next, t + z * t_next
+            continue
+
+        # Flush the run of similarities before a general matrix (or at the end)
+        run = trans._matrices(z.real, -z.imag, np.real(t), z.imag, z.real, np.imag(t))
+        matrix = run if matrix is None else matrix @ run
+        if factor is not None:
+            matrix = matrix @ factor.value
+            z, t = 1 + 0j, 0j
+
+    return matrix
@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+
+
+# RGB values of the matplotlib colour codes used by the display scripts
+COLOURS = {
+    'b': (0, 0, 255),
+    'g': (0, 128, 0),
+    'r': (255, 0, 0),
+    'c': (0, 191, 191),
+    'm': (191, 0, 191),
+    'y': (191, 191, 0),
+    'k': (0, 0, 0),
+    'w': (255, 255, 255),
+}
+
+
+def to_pixels(points, shape, extent):
+    """Maps homogeneous world 'points' (3 x P, or a stack of them) to pixel coordinates of an
+    image of 'shape' (height, width) showing the world rectangle 'extent' = (x_min, x_max, y_min,
+    y_max), with y pointing up as in the matplotlib axes. Returns the (x, y) column and row arrays."""
+
+    height, width = shape
+    x_min, x_max, y_min, y_max = extent
+    x = points[..., 0, :] / points[..., 2, :]
+    y = points[..., 1, :] / points[..., 2, :]
+
+    # Pixel (row, col) has its centre at (col + 0.5, row + 0.5) in these coordinates
+    return (x - x_min) * (width / (x_max - x_min)), (y_max - y) * (height / (y_max - y_min))
+
+
+def _window(x, y, shape, pad):
+    """Returns the (rows, cols) slices of the pixels whose centres may lie within 'pad'
+    pixels of the points' bounding box, clipped to the image, or None if they miss it."""
+
+    height, width = shape
+    r0, r1 = max(int(np.floor(y.min() - pad)), 0), min(int(np.ceil(y.max() + pad)), height)
+    c0, c1 = max(int(np.floor(x.min() - pad)), 0), min(int(np.ceil(x.max() + pad)), width)
+    if r0 >= r1 or c0 >= c1:
+        return None
+
+    return slice(r0, r1), slice(c0, c1)
+
+
+def polygon_mask(x, y, rows, cols):
+    """Inside test of the pixel centres of the window 'rows' x 'cols' against the closed polygon
+    with vertices x, y (pixel coordinates), using the nonzero winding rule. The edge function of
+    every edge is evaluated at every pixel at once, an (edges x h x w) array."""
+
+    px = np.arange(cols.start, cols.stop) + 0.5
+    py = (np.arange(rows.start, rows.stop) + 0.5)[:, None]
+    ax, ay = x[:-1, None, None], y[:-1, None, None]
+    bx, by = x[1:, None, None], y[1:, None, None]
+
+    # Positive when the pixel lies left of the edge a -> b
+    edge = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+    upward = (ay <= py) & (py < by)
+    downward = (by <= py) & (py < ay)
+    winding = np.sum((upward & (edge > 0)).astype(np.int8) - (downward & (edge < 0)), axis=0)
+
+    return winding != 0
+
+
+def outline_mask(x, y, rows, cols, line_width=1.0):
+    """Pixel centres of the window 'rows' x 'cols' within line_width / 2 of the polyline x, y."""
+
+    px = np.arange(cols.start, cols.stop) + 0.5
+    py = (np.arange(rows.start, rows.stop) + 0.5)[:, None]
+    ax, ay = x[:-1, None, None], y[:-1, None, None]
+    dx, dy = (x[1:] - x[:-1])[:, None, None], (y[1:] - y[:-1])[:, None, None]
+
+    # Closest point of every segment to every pixel, as a fraction t along the segment
+    length = np.maximum(dx * dx + dy * dy, 1e-12)
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / length, 0, 1)
+    distance = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+
+    return np.min(distance, axis=0) <= (line_width / 2) ** 2
+
+
+def draw_polygon(frame, x, y, colour, fill=False, line_width=1.0):
+    """Draws the polygon x, y (pixel coordinates, closed by repeating the first vertex as the
+    display scripts do) into 'frame' in place, filled or as an outline 'line_width' pixels wide.
+    Only the pixels around its bounding box are tested."""
+
+    window = _window(x, y, frame.shape[:2], 0 if fill else line_width / 2 + 1)
+    if window is None:
+        return
+
+    rows, cols = window
+    if fill:
+        mask = polygon_mask(x, y, rows, cols)
+    else:
+        mask = outline_mask(x, y, rows, cols, line_width)
+    frame[rows, cols][mask] = COLOURS.get(colour, colour)
+
+
+def render_frames(polygons, colours, shape=(480, 480), extent=(-6, 6, -6, 6), fill=False, line_width=2.0,
+                  background='w'):
+    """Renders an animation headless into an (N, height, width, 3) uint8 array. 'polygons' is a
+    list of (N, 3, P) stacks of homogeneous polygons, one per frame (as apply_transforms returns),
+    drawn in order with the matching 'colours' (matplotlib codes or RGB tuples)."""
+
+    x, y = zip(*(to_pixels(np.asarray(stack, dtype=float), shape, extent) for stack in polygons))
+    n_frames = len(x[0])
+
+    frames = np.empty((n_frames,) + tuple(shape) + (3,), dtype=np.uint8)
+    frames[...] = COLOURS.get(background, background)
+
+    for i in range(n_frames):
+        for k, colour in enumerate(colours):
+            draw_polygon(frames[i], x[k][i], y[k][i], colour, fill, line_width)
+
+    return frames
+
+
+def write_frames(frames, path):
+    """Writes rendered frames in bulk. A path ending in '.raw' gets one headerless file of
+    back-to-back RGB frames; otherwise 'path' is a pattern such as 'out/frame_{:04d}.ppm'
+    formatted with each frame index. Binary PPM files are written directly, any other image
+    format through matplotlib. Returns the number of frames written."""
+
+    frames = np.ascontiguousarray(frames, dtype=np.uint8)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if path.endswith('.raw'):
+        frames.tofile(path)
+        return len(frames)
+
+    if path.endswith('.ppm'):
+        header = f'P6\n{frames.shape[2]} {frames.shape[1]}\n255\n'.encode()
+        for i, frame in enumerate(frames):
+            with open(path.format(i), 'wb') as f:
+                f.write(header)
+                f.write(frame.tobytes())
+        return len(frames)
+
+    import matplotlib.pyplot as plt
+
+    for i, frame in enumerate(frames):
+        plt.imsave(path.format(i), frame)
+
+    return len(frames)
@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class Node():
+    """A node of a scene graph. Its 'local' transform places it relative to its parent (or the
+    world, for a root). 'motion' optionally maps a time value, or an array of N time values,
+    to the local transform (or an (N, 3, 3) stack of them) at that time.
+
+    The world transform is cached and only recomputed after the node or one of its ancestors
+    has been marked dirty, which happens whenever a local transform is set."""
+
+    def __init__(self, name, local=None, parent=None, motion=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.motion = motion
+        self._local = np.eye(3) if local is None else np.asarray(local)
+        self._world = None
+
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def local(self):
+        return self._local
+
+    @local.setter
+    def local(self, matrix):
+        self._local = np.asarray(matrix)
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        """Drops the cached world transform of this node and every node below it."""
+
+        # A dirty node's subtree is already dirty, so the walk stops there
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._world is not None:
+                node._world = None
+                stack.extend(node.children)
+
+    @property
+    def dirty(self):
+        return self._world is None
+
+    @property
+    def world(self):
+        """The transform from this node's coordinates to world coordinates."""
+
+        if self._world is None:
+            self._world = self._local if self.parent is None else self.parent.world @ self._local
+
+        return self._world
+
+    @property
+    def depth(self):
+        return 0 if self.parent is None else self.parent.depth + 1
+
+
+class SceneGraph():
+    """A hierarchy of Nodes, looked up by name, evaluated level by level: the world transforms
+    of all dirty nodes at one depth are computed together in a single stacked matrix product."""
+
+    def __init__(self):
+        self.nodes = {}
+        self._levels = None
+
+    def add(self, name, parent=None, local=None, motion=None):
+        """Adds a node below the node named 'parent' (or as a root) and returns it."""
+
+        if name in self.nodes:
+            raise ValueError(f"Node '{name}' already exists")
+
+        node = Node(name, local, self.nodes[parent] if parent is not None else None, motion)
+        self.nodes[name] = node
+        self._levels = None
+
+        return node
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+    def levels(self):
+        """Returns the nodes grouped by depth, roots first."""
+
+        if self._levels is None:
+            levels = {}
+            for node in self.nodes.values():
+                levels.setdefault(node.depth, []).append(node)
+            self._levels = [levels[depth] for depth in sorted(levels)]
+
+        return self._levels
+
+    def set_time(self, time):
+        """Sets the local transform of every animated node to its motion at 'time', a scalar or
+        an array of N time values."""
+
+        for node in self.nodes.values():
+            if node.motion is not None:
+                node.local = node.motion(time)
+
+    def evaluate(self, time=None):
+        """Returns a dict of the world transform of every node, after moving the animated nodes
+        to 'time' if given. For an array of N time values the transforms of animated nodes and
+        their descendants are (N, 3, 3) stacks, so a whole animation is evaluated in one call per
+        depth of the hierarchy; static nodes keep their single 3x3 transform."""
+
+        if time is not None:
+            self.set_time(time)
+
+        for level in self.levels():
+            dirty = [node for node in level if node.dirty]
+            if not dirty:
+                continue
+
+            # Nodes are stacked with others whose world transform has the same shape, so static
+            # nodes keep a single 3x3 world transform next to animated (N, 3, 3) ones
+            groups = {}
+            for node in dirty:
+                parent = np.eye(3) if node.parent is None else node.parent.world
+                shape = np.broadcast_shapes(parent.shape, node.local.shape)
+                groups.setdefault(shape, []).append((node, parent))
+
+            for shape, group in groups.items():
+                locals_ = np.stack([np.broadcast_to(node.local, shape) for node, _ in group])
+                parents = np.stack([np.broadcast_to(parent, shape) for _, parent in group])
+                for (node, _), world in zip(group, parents @ locals_):
+                    node._world = world
+
+        return {name: node.world for name, node in self.nodes.items()}
@@ -1,4 +1,5 @@
 import transforms as trans
+import scene_graph as scene
 
 
 def transform_earth(theta):
@@ -19,3 +20,17 @@ def transform_moon2(theta):
 def transform_moon3(theta):
     ## TASK: Replace this code with your own implementation.
     return transform_moon2(theta) @ trans.rotation(theta * 2) @ trans.translation([1, 0])
+
+
+def solar_system():
+    """Returns the Earth and moons as a scene graph, animated by theta (degrees), with the same
+    world transforms as the transform_* functions above. Moon #2 orbits at twice the Earth's
+    rate, so it hangs off the world rather than off the Earth."""
+
+    system = scene.SceneGraph()
+    system.add('earth', motion=trans.rotation)
+    system.add('moon1', parent='earth', local=trans.translation([5, 0]))
+    system.add('moon2', motion=lambda theta: trans.rotation(theta * 2) @ trans.translation([3, 0]))
+    system.add('moon3', parent='moon2', motion=lambda theta: trans.rotation(theta * 2) @ trans.translation([1, 0]))
+
+    return system
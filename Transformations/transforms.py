@@ -1,44 +1,61 @@
 import numpy as np
 
 
+def _matrices(a, b, c, d, e, f):
+    """Builds the affine matrices [[a, b, c], [d, e, f], [0, 0, 1]] from scalars or arrays of
+    equal length: one 3x3 matrix for scalars, an (N, 3, 3) stack for arrays."""
+
+    entries = np.broadcast_arrays(a, b, c, d, e, f)
+    matrix = np.zeros(entries[0].shape + (3, 3), dtype=np.result_type(*entries))
+    for (row, col), entry in zip([(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)], entries):
+        matrix[..., row, col] = entry
+    matrix[..., 2, 2] = 1
+
+    return matrix
+
+
 def scaling(scale_factor):
-    """Returns a transform matrix for uniform scaling about the origin by 'scale_factor'."""
+    """Returns a transform matrix for uniform scaling about the origin by 'scale_factor',
+    or an (N, 3, 3) stack of them for an array of N scale factors."""
     
-    matrix = np.array([[scale_factor, 0, 0],[0, scale_factor, 0],[0, 0, 1]])
+    matrix = _matrices(scale_factor, 0, 0, 0, scale_factor, 0)
 
     return matrix
 
 
 def translation(point):
     """Returns a transform matrix for translation by 'point[0]' units
-    along the x-axis and 'point[1]' units along the y-axis."""
+    along the x-axis and 'point[1]' units along the y-axis,
+    or an (N, 3, 3) stack of them for an (N, 2) array of points."""
 
-    matrix = np.array([[1, 0, point[0]],[0, 1, point[1]],[0, 0, 1]])
+    point = np.asarray(point)
+    matrix = _matrices(1, 0, point[..., 0], 0, 1, point[..., 1])
     
     return matrix
 
 
 def rotation(angle):
-    """Returns a transform matrix for anti-clockwise rotation about the origin by 'angle' degrees."""
+    """Returns a transform matrix for anti-clockwise rotation about the origin by 'angle' degrees,
+    or an (N, 3, 3) stack of them for an array of N angles."""
     
     angle = np.radians(angle)
+    cos, sin = np.cos(angle), np.sin(angle)
     
-    matrix = np.array([[np.cos(angle), -np.sin(angle), 0],
-                       [np.sin(angle), np.cos(angle), 0],
-                       [0, 0, 1]])
+    matrix = _matrices(cos, -sin, 0, sin, cos, 0)
     
     return matrix
 
 
 def rotation_scaling_and_translation(angle, scale_factor, point):
     """Returns a compound transform for rotating by 'angle', scaling by 'scaling_factor',
-    and translating by 'point'."""
+    and translating by 'point'. Any of them may be arrays of N values (N points), giving
+    an (N, 3, 3) stack of transforms."""
     
     rotate = rotation(angle)
     scale = scaling(scale_factor)
     trans = translation(point)
     
-    matrix = np.linalg.multi_dot([trans,scale,rotate])
+    matrix = trans @ scale @ rotate
     
     return matrix
 
@@ -47,10 +64,18 @@ def rotation_scaling_and_translation_postmultiplied(angle, scale_factor, point):
     """Returns a post-multiplied compound transform for rotating by 'angle',
     scaling by 'scaling_factor', and translating by 'point'."""
     
-    rotate = rotation(angle)
-    scale = scaling(scale_factor)
-    trans = translation(point)
-    
-    matrix = np.linalg.multi_dot([trans,scale,rotate])
+    matrix = rotation_scaling_and_translation(angle, scale_factor, point)
     
-    return matrix.T
+    return np.swapaxes(matrix, -1, -2)
+
+
+def apply_transforms(transforms, points):
+    """Applies a (3, 3) transform or an (N, 3, 3) stack of them to homogeneous 'points', one
+    point per column: a (3, P) polygon or an (N, 3, P) stack of point sets. All transforms are
+    applied in one matrix product and divided by the homogeneous coordinate, returning
+    (N, 3, P) points (or (3, P) for a single transform and polygon) with a last row of ones."""
+
+    result = np.matmul(transforms, points).astype(float, copy=False)
+    result /= result[..., 2:, :]
+
+    return result
@@ -0,0 +1,176 @@
+import numpy as np
+
+
+## 3D transforms as 4x4 homogeneous matrices acting on column vectors (x, y, z, 1), the
+## counterpart of transforms.py. Angles are in degrees as there, and every constructor takes
+## arrays of N values as well as scalars, returning an (N, 4, 4) stack.
+
+
+def _matrices(linear, offset=0):
+    """Builds 4x4 matrices from (..., 3, 3) linear parts and (..., 3) offsets."""
+
+    linear = np.asarray(linear)
+    offset = np.asarray(offset)
+    shape = np.broadcast_shapes(linear.shape[:-2], offset.shape[:-1] if offset.ndim else ())
+
+    matrix = np.zeros(shape + (4, 4), dtype=np.result_type(linear, offset, float))
+    matrix[..., :3, :3] = linear
+    matrix[..., :3, 3] = offset
+    matrix[..., 3, 3] = 1
+
+    return matrix
+
+
+def _rows(*rows):
+    """Stacks nested lists of scalars or equal-length arrays into (..., 3, 3) arrays."""
+
+    entries = np.broadcast_arrays(*(entry for row in rows for entry in row))
+
+    return np.stack(entries, axis=-1).reshape(entries[0].shape + (3, 3))
+
+
+def scaling(sx, sy=None, sz=None):
+    """Returns a transform for scaling about the origin by 'sx', 'sy' and 'sz' along the axes,
+    uniformly by 'sx' if only it is given."""
+
+    sy = sx if sy is None else sy
+    sz = sx if sz is None else sz
+
+    return _matrices(_rows([sx, 0, 0], [0, sy, 0], [0, 0, sz]))
+
+
+def translation(offset):
+    """Returns a transform for translation by 'offset' (x, y, z), or (N, 3) offsets."""
+
+    offset = np.asarray(offset)
+
+    return _matrices(np.broadcast_to(np.eye(3), offset.shape[:-1] + (3, 3)), offset)
+
+
+def rotation_x(angle):
+    """Returns a transform for anti-clockwise rotation about the x-axis by 'angle' degrees."""
+
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+
+    return _matrices(_rows([1, 0, 0], [0, c, -s], [0, s, c]))
+
+
+def rotation_y(angle):
+    """Returns a transform for anti-clockwise rotation about the y-axis by 'angle' degrees."""
+
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+
+    return _matrices(_rows([c, 0, s], [0, 1, 0], [-s, 0, c]))
+
+
+def rotation_z(angle):
+    """Returns a transform for anti-clockwise rotation about the z-axis by 'angle' degrees."""
+
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+
+    return _matrices(_rows([c, -s, 0], [s, c, 0], [0, 0, 1]))
+
+
+def euler_rotation(alpha, beta, gamma):
+    """Returns the rotation by 'alpha' about x, then 'beta' about y, then 'gamma' about z
+    (degrees), Rz @ Ry @ Rx, acting on column vectors.
+
+    ImplicitShape.calc_rotation_matrix builds this same Rz @ Ry @ Rx from angles in radians,
+    but returns it transposed with both axes reversed, for row vectors in reversed axis order:
+    calc_rotation_matrix(angles) == np.flipud(np.fliplr(R.T)) with
+    R = euler_rotation(*np.degrees(angles))[:3, :3]."""
+
+    return rotation_z(gamma) @ rotation_y(beta) @ rotation_x(alpha)
+
+
+def quaternion_rotation(quaternion):
+    """Returns the rotation of the quaternion (w, x, y, z), or of (N, 4) quaternions. They
+    need not be unit length, they are normalised first."""
+
+    q = np.asarray(quaternion, dtype=float)
+    w, x, y, z = np.moveaxis(q / np.linalg.norm(q, axis=-1, keepdims=True), -1, 0)
+
+    return _matrices(_rows([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+                           [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+                           [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)]))
+
+
+def axis_angle_quaternion(axis, angle):
+    """Returns the quaternion (w, x, y, z) rotating by 'angle' degrees about 'axis'."""
+
+    axis = np.asarray(axis, dtype=float)
+    half = np.radians(np.asarray(angle))[..., None] / 2
+
+    return np.concatenate([np.cos(half), np.sin(half) * axis / np.linalg.norm(axis, axis=-1, keepdims=True)],
+                          axis=-1)
+
+
+def look_at(eye, target, up=(0, 1, 0)):
+    """Returns the view transform of a camera at 'eye' looking at 'target', with 'up' roughly
+    upwards in the image: world coordinates to camera coordinates where the camera looks down
+    its -z axis with y up, as in OpenGL. Each argument may be an (N, 3) array of positions."""
+
+    eye, target, up = (np.asarray(v, dtype=float) for v in (eye, target, up))
+
+    def normalise(v):
+        return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+    back = normalise(eye - target)
+    right = normalise(np.cross(up, back))
+    true_up = np.cross(back, right)
+
+    # The rows of the rotation are the camera axes, and the eye moves to the origin
+    rotation = np.stack([right, true_up, back], axis=-2)
+
+    return _matrices(rotation, -np.einsum('...ij,...j->...i', rotation, eye))
+
+
+def perspective(fov_y, aspect, near, far):
+    """Returns the OpenGL perspective projection with vertical field of view 'fov_y' degrees
+    and width / height 'aspect', mapping the view frustum between the 'near' and 'far' planes
+    onto the cube [-1, 1]^3 after the homogeneous divide."""
+
+    f = 1 / np.tan(np.radians(fov_y) / 2)
+    shape = np.broadcast_shapes(*(np.shape(v) for v in (fov_y, aspect, near, far)))
+
+    matrix = np.zeros(shape + (4, 4))
+    matrix[..., 0, 0] = f / aspect
+    matrix[..., 1, 1] = f
+    matrix[..., 2, 2] = (far + near) / (near - far)
+    matrix[..., 2, 3] = 2 * far * near / (near - far)
+    matrix[..., 3, 2] = -1
+
+    return matrix
+
+
+def as_points(points):
+    """Returns an (N, 3) point cloud as a C-contiguous float32 array, without copying if it is one."""
+
+    return np.ascontiguousarray(points, dtype=np.float32)
+
+
+def apply(transform, points, out=None):
+    """Applies a 4x4 'transform' to an (N, 3) point cloud, dividing by the homogeneous coordinate
+    when the transform is projective. Works in float32 with one matrix product straight into
+    'out' (a new (N, 3) float32 array if None, which may also be 'points' itself) and in-place
+    updates, so no (N, 4) homogeneous copy of the cloud is ever made. A stack of K transforms
+    gives a (K, N, 3) result."""
+
+    points = as_points(points)
+    transform = np.asarray(transform, dtype=np.float32)
+    if out is None:
+        out = np.empty(transform.shape[:-2] + points.shape, dtype=np.float32)
+
+    projective = np.any(transform[..., 3, :3] != 0) or np.any(transform[..., 3, 3] != 1)
+    if projective:
+        # Homogeneous weights first, before 'out' (possibly 'points') is overwritten
+        w = np.matmul(points, transform[..., 3, :3, None])
+        w += transform[..., 3, 3, None, None]
+
+    np.matmul(points, np.swapaxes(transform[..., :3, :3], -1, -2), out=out)
+    out += transform[..., None, :3, 3]
+
+    if projective:
+        out /= w
+
+    return out